@@ -0,0 +1,160 @@
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from buguet.artifacts import load_contracts, load_artifact, parse_json, LazyContract
+
+ARTIFACT_FORMAT = b'BGA2'
+
+def load_artifacts(json_paths, source_roots, cache_dir = None):
+    if cache_dir and len(json_paths) > 1:
+        workers = min(len(json_paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(workers) as pool:
+            list(pool.map(prepare_cached_artifact, json_paths, repeat(source_roots), repeat(cache_dir)))
+    results = [load_cached_artifact(path, source_roots, cache_dir) for path in json_paths]
+    return [contract for contracts in results for contract in contracts]
+
+def load_cached_artifact(json_path, source_roots, cache_dir):
+    if cache_dir:
+        return ArtifactCache(cache_dir).load(json_path, source_roots)
+    return load_artifact(json_path, source_roots)
+
+def prepare_cached_artifact(json_path, source_roots, cache_dir):
+    ArtifactCache(cache_dir).prepare(json_path, source_roots)
+
+class ArtifactCache:
+    def __init__(self, directory):
+        self.directory = os.path.join(os.path.expanduser(directory), 'artifacts')
+        self.contracts_directory = os.path.join(os.path.expanduser(directory), 'contracts')
+
+    def load(self, json_path, source_roots):
+        with open(json_path, 'rb') as f:
+            raw = f.read()
+        key = self.key(raw, source_roots)
+        path = self.path(key)
+        headers = self.read(path)
+        loaders = {}
+        if headers is None:
+            contracts = load_contracts(parse_json(raw), source_roots)
+            self.write(path, contracts)
+            headers = [self.header(contract) for contract in contracts]
+            loaders = {i: contract.loader for i, contract in enumerate(contracts)}
+        result = []
+        for i, header in enumerate(headers):
+            loader = CachedContractLoader(self, self.contract_key(key, i), json_path, source_roots, i, loaders.get(i))
+            result.append(LazyContract(*header, loader))
+        return result
+
+    def prepare(self, json_path, source_roots):
+        with open(json_path, 'rb') as f:
+            raw = f.read()
+        key = self.key(raw, source_roots)
+        path = self.path(key)
+        if self.read(path) is not None:
+            return
+        contracts = load_contracts(parse_json(raw), source_roots)
+        for i, contract in enumerate(contracts):
+            self.write_entry(self.loader_path(self.contract_key(key, i)), contract.loader)
+        self.write(path, contracts)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def contract_path(self, key):
+        return os.path.join(self.contracts_directory, key + '.pickle')
+
+    def loader_path(self, key):
+        return os.path.join(self.contracts_directory, key + '.loader.pickle')
+
+    def header(self, contract):
+        return (contract.name, contract.bin_runtime, contract.bin_init, contract.source_list, contract.version)
+
+    def key(self, raw, source_roots):
+        h = hashlib.sha256(ARTIFACT_FORMAT)
+        h.update(raw)
+        for root in source_roots:
+            h.update(b'\0' + os.path.abspath(root).encode())
+        return h.hexdigest()
+
+    def read(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None
+        for src_path, digest in entry['sources']:
+            if not os.path.exists(src_path) or self.file_digest(src_path) != digest:
+                return None
+        return entry['contracts']
+
+    def contract_key(self, key, idx):
+        return hashlib.sha256(('%s:%d' % (key, idx)).encode()).hexdigest()
+
+    def read_contract(self, key):
+        return self.read_entry(self.contract_path(key))
+
+    def write_contract(self, key, contract):
+        self.write_entry(self.contract_path(key), contract)
+        if os.path.exists(self.loader_path(key)):
+            os.remove(self.loader_path(key))
+
+    def read_loader(self, key):
+        return self.read_entry(self.loader_path(key))
+
+    def read_entry(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def write_entry(self, path, value):
+        os.makedirs(self.contracts_directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def write(self, path, contracts):
+        source_paths = []
+        for contract in contracts:
+            for src_path in contract.source_list:
+                if src_path not in source_paths:
+                    source_paths.append(src_path)
+        entry = {
+            'sources': [(p, self.file_digest(p)) for p in source_paths],
+            'contracts': [self.header(contract) for contract in contracts]
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def file_digest(self, path):
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+class CachedContractLoader:
+    def __init__(self, cache, key, json_path, source_roots, idx, loader = None):
+        self.cache = cache
+        self.key = key
+        self.json_path = json_path
+        self.source_roots = source_roots
+        self.idx = idx
+        self.loader = loader
+
+    def load(self):
+        contract = self.cache.read_contract(self.key)
+        if contract is None:
+            loader = self.loader or self.cache.read_loader(self.key)
+            if loader is None:
+                loader = load_artifact(self.json_path, self.source_roots)[self.idx].loader
+            contract = loader.load()
+            self.cache.write_contract(self.key, contract)
+        return contract
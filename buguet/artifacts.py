@@ -0,0 +1,97 @@
+import json
+import os
+import re
+from buguet.contract_data_loader import ContractDataLoader
+from buguet.source_store import source_file
+
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = None
+
+def parse_json(raw):
+    if fast_json:
+        return fast_json.loads(raw)
+    return json.loads(raw)
+
+def load_artifact(json_path, source_roots):
+    with open(json_path, 'rb') as f:
+        return load_contracts(parse_json(f.read()), source_roots)
+
+def load_contracts(contract_data, source_roots):
+    version = parse_version(contract_data['version'])
+
+    contract_ast_by_id = {}
+    contract_ast_by_name = {}
+
+    source_list = resolve_source_list(contract_data['sourceList'], source_roots)
+
+    for key in contract_data['sources']:
+        base_ast = contract_data['sources'][key]['AST']
+        for contract_ast in base_ast.get('children', []):
+            if contract_ast['name'] == 'ContractDefinition':
+                contract_ast_by_id[contract_ast['id']] = contract_ast
+                contract_ast_by_name[contract_ast['attributes']['name']] = contract_ast
+
+    contracts = []
+    for key in contract_data.get('contracts', []):
+        name = key.split(":")[1]
+        asts = []
+        for contract_id in contract_ast_by_name[name]['attributes']['linearizedBaseContracts']:
+            asts.append(contract_ast_by_id[contract_id])
+        data = contract_data['contracts'][key]
+        if data['bin']:
+            loader = ContractLoader(data, list(reversed(asts)), source_list, version)
+            contracts.append(LazyContract(name, data['bin-runtime'], data['bin'], source_list, version, loader))
+    return contracts
+
+class LazyContract:
+    def __init__(self, name, bin_runtime, bin_init, source_list, version, loader):
+        self.name = name
+        self.bin_runtime = bin_runtime
+        self.bin_init = bin_init
+        self.source_list = source_list
+        self.version = version
+        self.loader = loader
+        self.contract = None
+
+    def load(self):
+        if not self.contract:
+            self.contract = self.loader.load()
+            self.loader = None
+        return self.contract
+
+class ContractLoader:
+    def __init__(self, data, asts, source_list, version):
+        self.data = data
+        self.asts = asts
+        self.source_list = source_list
+        self.version = version
+
+    def load(self):
+        sources = [source_file(path) for path in self.source_list]
+        return ContractDataLoader(self.data, self.asts, self.source_list, sources, self.version).load()
+
+def resolve_source_list(source_list, source_roots):
+    result = []
+    for src_path in source_list:
+        if not os.path.isabs(src_path):
+            abs_path = None
+            for src_root in source_roots:
+                p = os.path.abspath(os.path.join(src_root, src_path))
+                if os.path.exists(p):
+                    abs_path = p
+                    break
+            if not abs_path:
+                raise Exception(f"Can not find file: {src_path}")
+            result.append(abs_path)
+        else:
+            result.append(src_path)
+    return result
+
+def parse_version(version_str):
+    m = re.match(r"(\d+)\.(\d+)\.(\d+)", version_str)
+    return [int(m.group(1)), int(m.group(2)), int(m.group(3))]
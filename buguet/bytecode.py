@@ -0,0 +1,35 @@
+import hashlib
+
+LEGACY_METADATA_MARKER = "a165627a7a72305820"
+
+METADATA_KEYS = [b"bzzr0", b"bzzr1", b"ipfs", b"solc", b"experimental"]
+
+def cut_bin_metadata(code):
+    code = cut_cbor_trailer(code)
+    metadata_start = code.find(LEGACY_METADATA_MARKER)
+    if metadata_start == -1:
+        return code
+    return code[:metadata_start]
+
+def cut_cbor_trailer(code):
+    if len(code) < 4 or len(code) % 2 != 0:
+        return code
+    try:
+        length = int(code[-4:], 16)
+    except ValueError:
+        return code
+    start = len(code) - 4 - length * 2
+    if length == 0 or start < 0:
+        return code
+    try:
+        trailer = bytes.fromhex(code[start:-4])
+    except ValueError:
+        return code
+    if trailer[0] < 0xa1 or trailer[0] > 0xa5:
+        return code
+    if not any(key in trailer for key in METADATA_KEYS):
+        return code
+    return code[:start]
+
+def code_hash(code):
+    return hashlib.sha256(cut_bin_metadata(code).encode()).digest()
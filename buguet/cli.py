@@ -1,6 +1,6 @@
 import argparse
-import json
 from buguet.debugger import Debugger
+from buguet.artifact_cache import load_artifacts
 from buguet.repl import Repl
 from web3.middleware import geth_poa_middleware
 from web3 import Web3, HTTPProvider, IPCProvider
@@ -10,6 +10,8 @@ def main():
 
     parser.add_argument('--rpc', help="RPC of the ethereum node. Default is http://localhost:8545.", default="http://localhost:8545")
     parser.add_argument('--source-roots', help="Comma separated list of directies where source files will be searched in case there are relative source paths in combined json", default=".")
+    parser.add_argument('--cache-dir', help="Directory where transaction traces, fetched values and loaded contracts are cached between sessions. Default is ~/.buguet/cache.", default="~/.buguet/cache")
+    parser.add_argument('--no-cache', help="Do not read or write the cache", action='store_true')
     parser.add_argument('combined_json', help="""
         Comma separated list of json files produced by solidity compiler with --combined-json argument.
         Files should cover all called contracts (original contract can call another during transaction).
@@ -29,8 +31,11 @@ def main():
     web3 = Web3(provider)
     web3.middleware_stack.inject(geth_poa_middleware, layer=0)
     json_files = args.combined_json.split(",")
-    data = list(map(lambda f: json.load(open(f)), json_files))
+    source_roots = args.source_roots.split(",")
 
-    debugger = Debugger(web3, data, args.transaction_id, args.source_roots.split(","))
+    cache_dir = None if args.no_cache else args.cache_dir
+    contracts = load_artifacts(json_files, source_roots, cache_dir)
+
+    debugger = Debugger(web3, [], args.transaction_id, source_roots, cache_dir, contracts)
     Repl(debugger).repl()
 
@@ -1,5 +1,6 @@
 from buguet.models import *
 from buguet.util import ppp
+from array import array
 import re
 
 class ContractDataLoader:
@@ -46,7 +47,6 @@ class ContractDataLoader:
                 self.prepare_sourcemap(self.data['srcmap']),
                 self.source_list,
                 self.sources,
-                self.prepare_line_offsets(),
                 self.version
             )
 
@@ -288,10 +288,11 @@ class ContractDataLoader:
                     self.traverse_func(c, parent)
 
     def prepare_ops_mapping(self, code):
-        pc_to_op_idx = {}
         code = bytes.fromhex(code)
+        op_idxs = array('i', [-1]) * (len(code) + 32)
         i = 0
         op_num = 0
+        end = 0
         while i < len(code):
             if code[i] == 0xa1 and code[i+1] == 0x65:
                 break
@@ -300,57 +301,32 @@ class ContractDataLoader:
                 operands_size = b - 0x60 + 1
             else:
                 operands_size = 0
-            pc_to_op_idx[i] = op_num
-            for j in range(operands_size):
-                pc_to_op_idx[i + j + 1] = op_num
-            i += (1 + operands_size)
+            end = i + 1 + operands_size
+            op_idxs[i:end] = array('i', [op_num]) * (end - i)
+            i = end
             op_num += 1
-        return pc_to_op_idx
+        return PcMap(op_idxs[:end])
 
     def prepare_sourcemap(self, srcmap_str):
-        srcmap = {}
+        srcmap = SourceMap()
+        start = length = file_idx = jump = None
 
-        map_items = srcmap_str.split(";")
-
-        for i in range(len(map_items)):
-            map_item = map_items[i]
+        for map_item in srcmap_str.split(";"):
             arr = map_item.split(":")
 
             if len(arr) > 0 and arr[0] != '':
                 start = int(arr[0])
-            else:
-                start = srcmap[i-1].start
 
             if len(arr) > 1 and arr[1] != '':
                 length = int(arr[1])
-            else:
-                lenght = srcmap[i-1].length
 
             if len(arr) > 2 and arr[2] != '':
                 file_idx = int(arr[2])
                 if self.version < [0, 4, 11] and file_idx != -1:
                     file_idx -= 1
-            else:
-                file_idx = srcmap[i-1].file_idx
 
             if len(arr) > 3 and arr[3] != '':
                 jump = arr[3]
-            else:
-                jump = srcmap[i-1].jump
-
 
-            srcmap[i] = SrcMap(start, length, file_idx, jump)
+            srcmap.append(start, length, file_idx, jump)
         return srcmap
-
-    def prepare_line_offsets(self):
-        source_offsets = {}
-        for i, lines in enumerate(self.sources):
-            offset_by_line = []
-            pos = 0
-            for j in range(len(lines)):
-                offset_by_line.append(pos)
-                pos += len(lines[j]) + 1
-            offset_by_line.append(pos)
-            source_offsets[i] = offset_by_line
-        return source_offsets
-
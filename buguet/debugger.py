@@ -1,38 +1,55 @@
 from web3 import Web3
 import readline
-import sha3
-import re
 from buguet.models import *
-from buguet.contract_data_loader import *
+from buguet.artifacts import load_contracts, LazyContract
 from os import path
-from buguet.tracer import Tracer
+from buguet.tracer import Tracer, SnapshotError
+from buguet.snapshot_cache import SnapshotCache
+from buguet.trace_cache import TraceCache
+from buguet.trace_index import TraceIndex, JUMP_IN, JUMP_OUT
+from buguet import bytecode
+from buguet import rpc
+from buguet import slots
 from buguet.parser import *
+from buguet.expression import compile_expression, compile_js_program, reads_trace, JsStorageRef, EvalFailed
+from bisect import bisect_left, bisect_right
 import json
 import copy
-import os
+import threading
 from buguet.util import *
 
-class EvalFailed(Exception):
-    pass
-
 class VarNotYetInitialized(Exception):
     pass
 
 class EvalResultTooLarge(Exception):
     pass
 
+class SnapshotsPending(Exception):
+    pass
+
+class ConditionNotBoolean(Exception):
+    pass
+
 TRACE_REQ_LIMIT = 40
+EXPAND_LIMIT = 100000
+ELEMENTARY_TYPES = [Int, Uint, FixedBytes, Bool, Address]
 
 class Debugger:
-    def __init__(self, web3, contracts_data, transaction_id, source_roots = []):
+    def __init__(self, web3, contracts_data, transaction_id, source_roots = [], cache_dir = None, contracts = []):
         self.web3 = web3;
         self.transaction_id = transaction_id
         self.source_roots = source_roots
+        self.cache_dir = cache_dir
         self.position = 0
         self.bp_stack = []
         self.contracts_stack = []
+        self.code_cache = {}
         self.load_transaction_trace()
-        self.init_contracts(contracts_data)
+        self.init_contracts(contracts_data, contracts)
+        if self.trace_logs.finished:
+            self.prefetch_code()
+        else:
+            threading.Thread(target=self.prefetch_code, daemon=True).start()
         transaction = self.web3.eth.getTransaction(self.transaction_id)
 
         if transaction.to:
@@ -42,94 +59,113 @@ class Debugger:
             addr = tx_receipt.contractAddress.lower().replace('0x', '')
             self.load_contract_by_address(addr, True)
 
+        self.index = TraceIndex(self, self.bp_stack, self.contracts_stack)
         self.breakpoints = []
         self.trace_req_counter = 0
-
-    def init_contracts(self, contracts_data):
+        self.compiled_expressions = {}
+        self.compiled_conditions = {}
+        self.compiled_programs = {}
+        self.condition_hit_cache = {}
+        self.watches = []
+        self.pending_snapshots = None
+
+    def init_contracts(self, contracts_data, contracts):
         self.contracts = []
+        self.contracts_by_code = {}
 
         for contract_data in contracts_data:
-            version = self.parse_version(contract_data['version'])
-
-            contract_ast_by_id = {}
-            contract_ast_by_name = {}
-
-            source_list = self.resolve_source_list(contract_data['sourceList'])
-            sources = []
-            for src_path in source_list:
-                f = open(src_path, "rb")
-                src = f.read()
-                f.close()
-                sources.append(src.split(b"\n"))
-
-            for key in contract_data['sources']:
-                base_ast = contract_data['sources'][key]['AST']
-                for contract_ast in base_ast.get('children', []):
-                    if contract_ast['name'] == 'ContractDefinition':
-                        contract_ast_by_id[contract_ast['id']] = contract_ast
-                        contract_ast_by_name[contract_ast['attributes']['name']] = contract_ast
-
-            for key in contract_data.get('contracts', []):
-                name = key.split(":")[1]
-                asts = []
-                for contract_id in contract_ast_by_name[name]['attributes']['linearizedBaseContracts']:
-                    asts.append(contract_ast_by_id[contract_id])
-                data = contract_data['contracts'][key]
-                if data['bin']:
-                    contract = ContractDataLoader(data, list(reversed(asts)), source_list, sources, version).load()
-                    self.contracts.append(contract)
-
-    def resolve_source_list(self, source_list):
-        result = []
-        for src_path in source_list:
-            if not os.path.isabs(src_path):
-                abs_path = None
-                for src_root in self.source_roots:
-                    p = os.path.abspath(os.path.join(src_root, src_path))
-                    if os.path.exists(p):
-                        abs_path = p
-                        break
-                if not abs_path:
-                    raise Exception(f"Can not find file: {src_path}")
-                result.append(abs_path)
-            else:
-                result.append(src_path)
-        return result
+            for contract in load_contracts(contract_data, self.source_roots):
+                self.add_contract(contract)
+        for contract in contracts:
+            self.add_contract(contract)
 
-    def parse_version(self, version_str):
-        m = re.match(r"(\d+)\.(\d+)\.(\d+)", version_str)
-        return [int(m.group(1)), int(m.group(2)), int(m.group(3))]
+    def add_contract(self, contract):
+        self.contracts.append(contract)
+        self.contracts_by_code.setdefault(bytecode.code_hash(contract.bin_runtime), contract)
 
     def load_transaction_trace(self):
-        self.tracer = Tracer(self.web3, self.transaction_id)
-        self.trace_logs = self.tracer.get_base_logs()
+        trace_cache = None
+        cache = SnapshotCache()
+        if self.cache_dir:
+            trace_cache = TraceCache(self.cache_dir, self.chain_id(), self.transaction_id)
+            for query, value in trace_cache.load_snapshots().items():
+                cache.put((self.transaction_id,) + query, value)
+
+        self.tracer = Tracer(self.web3, self.transaction_id, cache, trace_cache)
+
+        self.trace_logs = None
+        if trace_cache:
+            self.trace_logs = trace_cache.load_base_logs()
+        if self.trace_logs is None:
+            if self.tracer.can_stream():
+                on_finish = trace_cache.store_base_logs if trace_cache else None
+                self.trace_logs = self.tracer.stream_base_logs(on_finish)
+            else:
+                self.trace_logs = self.tracer.get_base_logs()
+                if trace_cache:
+                    trace_cache.store_base_logs(self.trace_logs)
+        self.trace_logs.wait_for(0)
+
+    def chain_id(self):
+        try:
+            return int(self.web3.manager.request_blocking("eth_chainId", []), 16)
+        except ValueError:
+            return int(self.web3.version.network)
 
     def load_contract_by_address(self, address, is_init):
-        code = self.web3.eth.getCode(Web3.toChecksumAddress(address)).hex()
+        self.enter_contract(self.resolve_contract_call(address, is_init), self.bp_stack, self.contracts_stack)
+
+    def resolve_contract_call(self, address, is_init):
+        code, contract = self.code_for_address(address)
+        if len(code) > 0:
+            if not contract:
+                raise Exception("No matching contract found in provided solidity data")
+            return ContractCall(address, self.load_contract(contract), is_init)
+
+    def code_for_address(self, address):
+        if address not in self.code_cache:
+            code = self.web3.eth.getCode(Web3.toChecksumAddress(address)).hex()
+            self.cache_code(address, code)
+        return self.code_cache[address]
+
+    def cache_code(self, address, code):
         code = code.replace("0x", "")
+        contract = None
         if len(code) > 0:
-            contract = self.find_contract_by_code(code)
-            el = ContractCall(address, contract, is_init)
-            self.contracts_stack.append(el)
-            if is_init:
-                self.bp_stack.append(-1)
-            else:
-                if contract.version < [0, 5, 1]:
-                    self.bp_stack.append(-1)
+            contract = self.contracts_by_code.get(bytecode.code_hash(code))
+        self.code_cache[address] = (code, contract)
 
-    def find_contract_by_code(self, code):
-        code = self.cut_bin_metadata(code)
-        for contract in self.contracts:
-            if self.cut_bin_metadata(contract.bin_runtime) == code:
-                return contract
-        raise Exception("No matching contract found in provided solidity data")
+    def prefetch_code(self):
+        try:
+            self.trace_logs.wait_finished()
+        except Exception:
+            return
+        addresses = [a for a in self.trace_logs.call_targets() if a not in self.code_cache]
+        try:
+            if rpc.is_http(self.web3):
+                params = [[Web3.toChecksumAddress(a), "latest"] for a in addresses]
+                codes = rpc.batch_request(self.web3, "eth_getCode", params)
+            else:
+                codes = [self.web3.eth.getCode(Web3.toChecksumAddress(a)).hex() for a in addresses]
+        except Exception:
+            return
+        for address, code in zip(addresses, codes):
+            if code is not None:
+                self.cache_code(address, code)
+
+    def enter_contract(self, el, bp_stack, contracts_stack):
+        if el:
+            contracts_stack.append(el)
+            if el.is_init:
+                bp_stack.append(-1)
+            else:
+                if el.contract.version < [0, 5, 1]:
+                    bp_stack.append(-1)
 
-    def find_contract_by_init_code(self, code):
-        code = self.cut_bin_metadata(code)
-        for contract in self.contracts:
-            if self.cut_bin_metadata(contract.bin_init) == code:
-                return contract
-        raise Exception("No matching contract found in provided solidity data")
+    def load_contract(self, contract):
+        if isinstance(contract, LazyContract):
+            return contract.load()
+        return contract
 
     def current_contract(self):
         return self.contracts_stack[-1].contract
@@ -140,16 +176,11 @@ class Debugger:
     def current_contract_is_init(self):
         return self.contracts_stack[-1].is_init
 
-    def cut_bin_metadata(self, code):
-        metadata_start = code.find("a165627a7a72305820")
-        if metadata_start == -1:
-            return code
-        return code[:metadata_start]
-
     def current_op(self):
         return self.trace_logs[self.position]
 
     def is_ended(self):
+        self.trace_logs.wait_for(self.position)
         return self.position >= len(self.trace_logs)
 
     def current_instruction_num(self):
@@ -157,7 +188,7 @@ class Debugger:
             pc_to_op_idx = self.current_contract().pc_to_op_idx_init
         else:
             pc_to_op_idx = self.current_contract().pc_to_op_idx_runtime
-        return pc_to_op_idx.get(self.current_op()["pc"], -1)
+        return pc_to_op_idx.get(self.trace_logs.pc(self.position), -1)
 
     def current_src_fragment(self):
         if self.current_contract_is_init():
@@ -173,113 +204,255 @@ class Debugger:
         return self.current_contract().sources[self.current_src_fragment().file_idx]
 
     def current_source_path(self):
-        return self.current_contract().source_list[self.current_src_fragment().file_idx]
+        return self.index.source_path(self.position)
 
     def current_line_number(self):
-        frag = self.current_src_fragment()
-        if frag.file_idx == -1:
-            return -1
-        offset_by_line = self.current_contract().source_offsets[frag.file_idx]
-        offset = frag.start
-        start = 0
-        end = len(offset_by_line)
-        while True:
-            idx = (start + end) // 2
-            s = offset_by_line[idx]
-            s1 = offset_by_line[idx + 1]
-            if offset >= s and offset < s1:
-                return idx
-            elif offset < s:
-                end = idx - 1
-            elif offset >= s1:
-                start = idx + 1
+        return self.index.line(self.position)
 
     def current_func(self):
-        contract = self.current_contract()
-        start = self.current_src_fragment().start
-        for f in contract.functions:
-            if start >= f.src.start and start < f.src.start + f.src.length:
-                return f
+        function_idx = self.index.function(self.position)
+        if function_idx != -1:
+            return self.current_contract().functions[function_idx]
+
+    def get_snapshots(self, queries):
+        if self.pending_snapshots is not None and not self.tracer.has_snapshots(queries):
+            self.pending_snapshots.extend(queries)
+            raise SnapshotsPending()
+        if not self.tracer.has_snapshots(queries):
+            self.trace_req_counter += 1
+            if self.trace_req_counter >= TRACE_REQ_LIMIT:
+                raise EvalResultTooLarge()
+        return self.tracer.get_snapshots(queries)
+
+    def get_snapshot(self, kind, key=None):
+        query = (self.position, kind, key)
+        value = self.get_snapshots([query])[query]
+        if type(value) is SnapshotError:
+            raise EvalFailed()
+        return value
 
     def get_storage_at_address(self, address):
-        self.trace_req_counter += 1
-        if self.trace_req_counter >= TRACE_REQ_LIMIT:
-            raise EvalResultTooLarge()
-        return self.tracer.get_storage(self.position, address.hex())
+        return self.get_snapshot('storage', address.hex())
 
     def advance(self):
         self.check_function_switch()
         self.check_contract_switch()
         self.position += 1
 
+    def advance_to(self, position):
+        if position is None:
+            self.index.ensure_all()
+            position = len(self.trace_logs)
+        checkpoint, bp_stack, contracts_stack = self.index.checkpoint_before(position)
+        if checkpoint > self.position or position < self.position:
+            self.position = checkpoint
+            self.bp_stack[:] = bp_stack
+            self.contracts_stack[:] = contracts_stack
+        for event in self.index.events_between(self.position, position):
+            self.position = event
+            self.check_function_switch()
+            self.check_contract_switch()
+        self.position = position
+
+    def goto(self, position):
+        if position < 0 or not self.index.ensure(position):
+            raise ValueError("Position is invalid")
+        self.advance_to(position)
+
     def check_function_switch(self):
-        if self.current_src_fragment().jump == 'i':
-            self.bp_stack.append(self.current_op()['stack_length'] - 1)
-        if self.current_src_fragment().jump == 'o' and len(self.bp_stack) > 0:
+        jump = self.index.jump(self.position)
+        if jump == JUMP_IN:
+            self.bp_stack.append(self.trace_logs.stack_length(self.position) - 1)
+        if jump == JUMP_OUT and len(self.bp_stack) > 0:
             self.bp_stack.pop()
 
     def check_contract_switch(self):
-        op = self.current_op()
-        if op['op'] in ['CALL', 'STATICCALL', 'DELEGATECALL', 'CALLCODE']:
-            address = op['new_address']
+        self.switch_contract(self.position, self.bp_stack, self.contracts_stack)
+
+    def switch_contract(self, position, bp_stack, contracts_stack):
+        op = self.trace_logs.op(position)
+        if op in ['CALL', 'STATICCALL', 'DELEGATECALL', 'CALLCODE']:
+            address = self.trace_logs.new_address(position)
             address = int(address).to_bytes(20, byteorder='big').hex()
-            self.load_contract_by_address(address, False)
-        elif op['op'] == 'CREATE':
-            address = op['new_address']
-            self.load_contract_by_address(address, True)
-        elif op['op'] in ['STOP', 'RETURN', 'REVERT']:
-            if self.current_contract_is_init() or op['op'] == 'REVERT':
-                self.bp_stack.pop()
-            self.contracts_stack.pop()
+            self.enter_contract(self.resolve_contract_call(address, False), bp_stack, contracts_stack)
+        elif op == 'CREATE':
+            address = self.trace_logs.new_address(position)
+            self.enter_contract(self.resolve_contract_call(address, True), bp_stack, contracts_stack)
+        elif op in ['STOP', 'RETURN', 'REVERT']:
+            if contracts_stack[-1].is_init or op == 'REVERT':
+                bp_stack.pop()
+            contracts_stack.pop()
 
     def step(self):
-        start_line_number = self.current_line_number()
-        while True:
-            self.advance()
-            if self.is_ended():
-                return
-            line_number = self.current_line_number()
-            if line_number != -1 and line_number != start_line_number:
-                return
+        self.advance_to(self.index.next_stop(self.position))
 
     def next(self):
         start_stack_height = len(self.bp_stack)
-        while True:
-            self.step()
-            if self.is_ended():
-                return
-            if len(self.bp_stack) <= start_stack_height:
-                if self.current_src_fragment().jump == 'o':
-                    self.step()
-                break
+        stop = self.index.next_stop(self.position, max_depth = start_stack_height)
+        if stop is not None and self.index.jump(stop) == JUMP_OUT:
+            stop = self.index.next_stop(stop)
+        self.advance_to(stop)
 
     def stepout(self):
         start_stack_height = len(self.bp_stack)
-        while True:
-            self.step()
-            if self.is_ended():
-                return
-            if len(self.bp_stack) == start_stack_height - 1:
-                break
+        self.advance_to(self.index.next_stop(self.position, depth = start_stack_height - 1))
 
     def continu(self):
         self.step()
         if self.is_ended():
             return
-        while True:
-            self.advance()
-            if self.is_ended():
-                return
-            for bp in self.breakpoints:
-                if (bp.src == self.current_source_path()
-                        and bp.line == self.current_line_number() + 1):
-                    return
+        start = self.position + 1
+        hit = self.index.next_hit(start, self.breakpoint_locations())
+        for bp in self.breakpoints:
+            if bp.condition:
+                condition_hit = self.next_condition_hit(bp, start)
+                if condition_hit is not None and (hit is None or condition_hit < hit):
+                    hit = condition_hit
+        self.advance_to(hit)
+
+    def breakpoint_locations(self):
+        locations = set()
+        for bp in self.breakpoints:
+            if not bp.condition:
+                locations.add(self.breakpoint_location(bp))
+        return locations
+
+    def breakpoint_location(self, bp):
+        return (self.index.source_id(bp.src), bp.line - 1)
+
+    def next_condition_hit(self, bp, start):
+        if not self.index.ensure(start):
+            return None
+        location = self.breakpoint_location(bp)
+        if (self.index.source(start), self.index.line(start)) == location:
+            runs = self.index.runs[location]
+            if runs[bisect_right(runs, start) - 1] != start:
+                if self.find_condition_hits(bp.condition, [start]):
+                    return start
+        hits = self.condition_hits(bp)
+        k = bisect_left(hits, start)
+        if k < len(hits):
+            return hits[k]
+
+    def prev_condition_hit(self, bp, position):
+        location = self.breakpoint_location(bp)
+        if self.index.ensure(position) and (self.index.source(position), self.index.line(position)) == location:
+            runs = self.index.runs[location]
+            position = runs[bisect_right(runs, position) - 1]
+        hits = self.condition_hits(bp)
+        k = bisect_left(hits, position) - 1
+        if k >= 0:
+            return hits[k]
+
+    def condition_hits(self, bp):
+        location = self.breakpoint_location(bp)
+        key = (location, bp.condition)
+        if key not in self.condition_hit_cache:
+            self.index.ensure_all()
+            positions = self.index.runs.get(location, [])
+            self.condition_hit_cache[key] = self.find_condition_hits(bp.condition, positions)
+        return self.condition_hit_cache[key]
+
+    def find_condition_hits(self, condition, positions):
+        compiled = self.compile_condition(condition)
+        position, bp_stack, contracts_stack = self.position, list(self.bp_stack), list(self.contracts_stack)
+        programs = {}
+        queries = {}
+        fallback = []
+        try:
+            for p in positions:
+                self.advance_to(p)
+                try:
+                    if not compiled:
+                        raise EvalFailed()
+                    code, value_type = compiled(self)
+                except VarNotYetInitialized:
+                    continue
+                except EvalFailed:
+                    fallback.append(p)
+                    continue
+                if value_type is not bool:
+                    raise ConditionNotBoolean()
+                queries[p] = programs.setdefault(code, len(programs))
+            hits = self.find_fallback_condition_hits(condition, fallback)
+        finally:
+            self.position = position
+            self.bp_stack[:] = bp_stack
+            self.contracts_stack[:] = contracts_stack
+        if queries:
+            hits += self.tracer.get_condition_hits(list(programs), queries)
+        return sorted(hits)
+
+    def find_fallback_condition_hits(self, condition, positions):
+        compiled = self.compile_expression(condition)
+        hits = []
+        rounds = 0
+        while positions and rounds < TRACE_REQ_LIMIT:
+            unresolved = []
+            self.pending_snapshots = []
+            try:
+                for p in positions:
+                    self.advance_to(p)
+                    try:
+                        value = compiled(self)
+                        if type(value) is Variable:
+                            self.prefetch_var(value)
+                            value = self.expand_var(value)
+                    except SnapshotsPending:
+                        unresolved.append(p)
+                        continue
+                    except (EvalFailed, VarNotYetInitialized, EvalResultTooLarge):
+                        continue
+                    if type(value) is not bool:
+                        raise ConditionNotBoolean()
+                    if value:
+                        hits.append(p)
+                pending = self.pending_snapshots
+            finally:
+                self.pending_snapshots = None
+                self.trace_req_counter = 0
+            if pending:
+                self.tracer.get_snapshots(pending)
+            positions = unresolved
+            rounds += 1
+        return hits
+
+    def compile_condition(self, condition):
+        if condition not in self.compiled_conditions:
+            try:
+                self.compiled_conditions[condition] = compile_js_program(Parser(condition).parse())
+            except EvalFailed:
+                self.compiled_conditions[condition] = None
+        return self.compiled_conditions[condition]
+
+    def bstep(self):
+        self.goto(self.index.prev_stop(self.position) or 0)
+
+    def bnext(self):
+        start_stack_height = len(self.bp_stack)
+        self.goto(self.index.prev_stop(self.position, max_depth = start_stack_height) or 0)
+
+    def bstepout(self):
+        start_stack_height = len(self.bp_stack)
+        self.goto(self.index.prev_stop(self.position, max_depth = start_stack_height - 1) or 0)
+
+    def rcontinue(self):
+        hit = self.index.prev_hit(self.position, self.breakpoint_locations())
+        for bp in self.breakpoints:
+            if bp.condition:
+                condition_hit = self.prev_condition_hit(bp, self.position)
+                if condition_hit is not None and (hit is None or condition_hit > hit):
+                    hit = condition_hit
+        self.goto(hit or 0)
 
     def eval(self, line):
         try:
-            expr = Parser(line).parse()
-            res = self.eval_expr(expr)
+            compiled = self.compile_expression(line)
+            res = self.eval_in_tracer(line)
+            if res is None:
+                res = compiled(self)
             if type(res) is Variable:
+                self.prefetch_var(res)
                 return self.expand_var(res)
             return res
         except ParsingFailed:
@@ -293,80 +466,118 @@ class Debugger:
         finally:
             self.trace_req_counter = 0
 
-    def eval_expr(self, expr):
-        if type(expr) is Literal:
-            return expr.value
-        elif type(expr) is Name:
-            if expr.value == "this":
-                return self.tracer.get_address(self.position)
-            return self.eval_var(expr.value)
-        elif type(expr) is ApplyBrackets:
-            return self.eval_apply_brackets(expr)
-        elif type(expr) is ApplyDot:
-            return self.eval_apply_dot(expr)
-        elif type(expr) is Not:
-            value = self.eval_expr(expr.value)
-            if type(value) != bool:
-                raise EvalFailed()
-            return not value
-        elif type(expr) in [Mult, Div, Mod, Plus, Minus, Lt, Gt, Le, Ge, Eq, NotEq, And, Or]:
-            return self.eval_binary_operator(expr)
-        else:
-            raise EvalFailed()
-
-    def eval_binary_operator(self, expr):
-        left = self.eval_expr(expr.left)
-        right = self.eval_expr(expr.right)
-
-        if type(left) != type(right):
-            raise EvalFailed()
+    def add_watch(self, line):
+        try:
+            self.compile_expression(line)
+        except ParsingFailed:
+            return False
+        self.watches.append(line)
+        return True
 
-        if (type(expr) is Plus and not type(left) in [int, str]) or \
-           (type(expr) in [And, Or] and type(left) != bool) or \
-           (type(expr) in [Mult, Div, Mod, Minus, Gt, Ge, Lt, Le] and type(left) != int):
-            raise EvalFailed()
+    def eval_watches(self):
+        results = {}
+        rounds = 0
+        while True:
+            self.pending_snapshots = []
+            try:
+                for line in self.watches:
+                    if line not in results:
+                        try:
+                            results[line] = self.eval(line)
+                        except SnapshotsPending:
+                            pass
+                pending = self.pending_snapshots
+            finally:
+                self.pending_snapshots = None
+            if not pending:
+                break
+            rounds += 1
+            if rounds >= TRACE_REQ_LIMIT:
+                break
+            self.tracer.get_snapshots(pending)
+        return [(line, results.get(line, "Evaluation result is too large")) for line in self.watches]
+
+    def compile_expression(self, line):
+        if line not in self.compiled_expressions:
+            self.compiled_expressions[line] = compile_expression(Parser(line).parse())
+        return self.compiled_expressions[line]
+
+    def eval_in_tracer(self, line):
+        program = self.compile_program(line)
+        if not program:
+            return None
+        try:
+            code, value_type = program(self)
+        except (EvalFailed, VarNotYetInitialized):
+            return None
+        if value_type is int:
+            code = "%s.toString()" % code
+        elif value_type is Address:
+            code = "h.hex(%s, 20)" % code
+        try:
+            result = self.get_snapshot('program', code)
+        except EvalFailed:
+            return None
+        if value_type is int:
+            return int(result[0])
+        return result[0]
 
-        elif type(expr) is Mult:
-            return left * right
-        elif type(expr) is Div:
-            if right == 0:
-                raise EvalFailed()
-            return left // right
-        elif type(expr) is Mod:
-            if right == 0:
-                raise EvalFailed()
-            return left % right
-        if type(expr) is Plus:
-            return left + right
-        elif type(expr) is Minus:
-            return left - right
-        elif type(expr) is Gt:
-            return left > right
-        elif type(expr) is Ge:
-            return left >= right
-        elif type(expr) is Lt:
-            return left < right
-        elif type(expr) is Le:
-            return left <= right
-        elif type(expr) is Eq:
-            return left == right
-        elif type(expr) is NotEq:
-            return left != right
-        elif type(expr) is And:
-            return left and right
-        elif type(expr) is Or:
-            return left or right
-        else:
-            raise EvalFailed()
+    def compile_program(self, line):
+        if line not in self.compiled_programs:
+            expr = Parser(line).parse()
+            try:
+                self.compiled_programs[line] = compile_js_program(expr) if reads_trace(expr) else None
+            except EvalFailed:
+                self.compiled_programs[line] = None
+        return self.compiled_programs[line]
 
     def eval_var(self, var_name):
         function = self.current_func()
+        return self.eval_binding(function, self.var_binding(function, var_name))
+
+    def var_binding(self, function, var_name):
+        if function:
+            if var_name in function.params_by_name:
+                var = function.params_by_name[var_name]
+                return (var, var.location - len(function.params))
+            elif var_name in function.local_vars_by_name:
+                var = function.local_vars_by_name[var_name]
+                return (var, var.location + len(function.return_vars))
+            elif var_name in function.return_vars_by_name:
+                var = function.return_vars_by_name[var_name]
+                return (var, var.location)
+
+        if var_name in self.current_contract().variables_by_name:
+            return (self.current_contract().variables_by_name[var_name], None)
+
+    def eval_binding(self, function, binding):
         if not function:
             raise EvalFailed()
 
         if len(self.bp_stack) == 0:
             raise EvalFailed()
 
+        if not binding:
+            raise EvalFailed()
+
+        var, offset = binding
+        if offset is None:
+            return self.eval_storage(var)
+
+        data = self.get_snapshot('stack', self.stack_location(function, offset))
+        if type(var.var_type) in [Int, Uint, FixedBytes, Bool, Address]:
+            return self.elementary_type_as_obj(var.var_type, data)
+        else:
+            new_location = (int).from_bytes(data, 'big')
+            new_var = Variable(var.var_type, location = new_location, offset = 0, location_type = var.location_type)
+            if var.location_type == 'memory':
+                return self.eval_memory(new_var)
+            elif var.location_type == 'storage':
+                return self.eval_storage(new_var)
+            else:
+                raise EvalFailed()
+
+    def stack_location(self, function, offset):
         bp = self.bp_stack[-1]
         if bp == -1:
             if self.current_contract_is_init():
@@ -374,44 +585,33 @@ class Debugger:
             else:
                 bp = len(function.params) + 2
 
-        var = None
-        location = None
-
-        if var_name in function.params_by_name:
-            var = function.params_by_name[var_name]
-            location = bp - len(function.params) + var.location
-        elif var_name in function.local_vars_by_name:
-            var = function.local_vars_by_name[var_name]
-            location = bp + var.location + len(function.return_vars)
-        elif var_name in function.return_vars_by_name:
-            var = function.return_vars_by_name[var_name]
-            location = bp + var.location
-
-        if var:
-            if location >= self.current_op()['stack_length']:
-                raise VarNotYetInitialized()
-            data = self.tracer.get_stack(self.position, location)
-            if type(var.var_type) in [Int, Uint, FixedBytes, Bool, Address]:
-                return self.elementary_type_as_obj(var.var_type, data)
-            else:
-                new_location = (int).from_bytes(data, 'big')
-                new_var = Variable(var.var_type, location = new_location, offset = 0, location_type = var.location_type)
-                if var.location_type == 'memory':
-                    return self.eval_memory(new_var)
-                elif var.location_type == 'storage':
-                    return self.eval_storage(new_var)
-                else:
-                    raise EvalFailed()
+        location = bp + offset
+        if location >= self.trace_logs.stack_length(self.position):
+            raise VarNotYetInitialized()
+        return location
 
-        if var_name in self.current_contract().variables_by_name:
-            var = self.current_contract().variables_by_name[var_name]
-            return self.eval_storage(var)
-        else:
+    def js_binding(self, function, binding):
+        if not function or len(self.bp_stack) == 0 or not binding:
             raise EvalFailed()
 
-    def eval_apply_brackets(self, expr):
-        var = self.eval_expr(expr.left)
-        key = self.eval_expr(expr.right)
+        var, offset = binding
+        var_type = var.var_type
+        if offset is None:
+            return JsStorageRef("bigInt('%d')" % var.location, "%d" % var.offset, var_type)
+        value = "h.stack(log, %d)" % self.stack_location(function, offset)
+        if type(var_type) is Int:
+            return ("h.signed(%s, 256)" % value, int)
+        if type(var_type) is Uint:
+            return (value, int)
+        if type(var_type) is Bool:
+            return ("%s.equals(1)" % value, bool)
+        if type(var_type) is Address:
+            return ("h.bits(%s, 0, 160)" % value, Address)
+        if var.location_type == 'storage' and type(var_type) not in [FixedBytes, String, Bytes]:
+            return JsStorageRef(value, "0", var_type)
+        raise EvalFailed()
+
+    def apply_brackets(self, var, key):
         if not type(var) is Variable:
             raise EvalFailed()
         if var.location_type == 'memory':
@@ -431,17 +631,9 @@ class Debugger:
         else:
             raise EvalFailed()
 
-    def eval_apply_dot(self, expr):
-        if expr.left == Name("msg"):
-            if expr.right.value == "sender":
-                return self.tracer.get_sender(self.position)
-            if expr.right.value == "value":
-                return self.tracer.get_value(self.position)
-
-        var = self.eval_expr(expr.left)
+    def apply_dot(self, var, key):
         if not type(var) is Variable or not type(var.var_type) is Struct:
             raise EvalFailed()
-        key = expr.right.value
         if var.location_type == 'memory':
             return self.eval_memory_struct_at_key(var, key)
         elif var.location_type == 'storage':
@@ -450,10 +642,17 @@ class Debugger:
             raise EvalFailed()
 
     def get_memory(self, idx):
-        self.trace_req_counter += 1
-        if self.trace_req_counter >= TRACE_REQ_LIMIT:
-            raise EvalResultTooLarge()
-        return self.tracer.get_memory(self.position, idx)
+        return self.get_snapshot('memory', idx)
+
+    def get_memory_range(self, offset, length):
+        if length == 0:
+            return bytes()
+        return self.get_snapshot('memory_range', (offset, length))
+
+    def get_storage_range(self, slot, count):
+        if count == 0:
+            return bytes()
+        return self.get_snapshot('storage_range', ('%064x' % slot, count))
 
     def eval_memory(self, var):
         if type(var.var_type) in [Int, Uint, FixedBytes, Bool, Address]:
@@ -473,28 +672,23 @@ class Debugger:
         elif type(var.var_type) is Array:
             off = idx + 1
         addr = var.location + off * 32
-        if type(var.var_type.element_type) in [String, Bytes, Struct, Array, FixedArray]:
-            addr = int.from_bytes(self.get_memory(addr), byteorder='big')
-        new_var = Variable(var.var_type.element_type, location = addr, location_type = 'memory')
-        return self.eval_memory(new_var)
+        return self.eval_memory(self.memory_element(var.var_type.element_type, addr))
 
     def eval_memory_struct_at_key(self, var, key):
         for i, field in enumerate(var.var_type.variables):
             if field.name == key:
-                addr = var.location + i * 32
-                if type(field.var_type) in [String, Bytes, Struct, Array, FixedArray]:
-                    addr = int.from_bytes(self.get_memory(addr), byteorder='big')
-                new_var = Variable(field.var_type, location = addr, location_type = 'memory')
-                return self.eval_memory(new_var)
+                return self.eval_memory(self.memory_element(field.var_type, var.location + i * 32))
         raise EvalFailed()
 
+    def memory_element(self, var_type, addr):
+        if type(var_type) in [String, Bytes, Struct, Array, FixedArray]:
+            addr = int.from_bytes(self.get_memory(addr), byteorder='big')
+        return Variable(var_type, location = addr, location_type = 'memory')
+
     def eval_memory_string_or_bytes(self, var):
-        result = bytes()
         length = (int).from_bytes(self.get_memory(var.location), 'big')
         num_memory_words = (length + 31) // 32
-        for i in range(num_memory_words):
-            data = self.get_memory(var.location + (i + 1) * 32)[:length - i*32]
-            result += data
+        result = self.get_memory_range(var.location + 32, num_memory_words * 32)[:length]
         return self.elementary_type_as_obj(var.var_type, result)
 
     def eval_storage(self, var):
@@ -508,10 +702,13 @@ class Debugger:
     def eval_storage_elementary_type(self, var):
         address = var.location.to_bytes(32, byteorder='big')
         result = self.get_storage_at_address(address)
-        result_int = int.from_bytes(result, byteorder='big')
-        result_int = (result_int >> var.offset) & ((2 << var.var_type.size - 1) - 1)
-        result = result_int.to_bytes(var.var_type.size // 8, byteorder='big')
-        return self.elementary_type_as_obj(var.var_type, result)
+        return self.storage_word_as_obj(var.var_type, var.offset, result)
+
+    def storage_word_as_obj(self, var_type, offset, word):
+        result_int = int.from_bytes(word, byteorder='big')
+        result_int = (result_int >> offset) & ((2 << var_type.size - 1) - 1)
+        result = result_int.to_bytes(var_type.size // 8, byteorder='big')
+        return self.elementary_type_as_obj(var_type, result)
 
     def eval_storage_string_or_bytes(self, var):
         address = var.location.to_bytes(32, 'big')
@@ -520,15 +717,8 @@ class Debugger:
         large_string = data_int & 0x1
         if large_string:
             bytes_length = (data_int - 1) // 2
-            s = sha3.keccak_256()
-            s.update(address)
-            large_str_address = s.digest()
-            result = bytes()
-            for i in range(0, bytes_length // 32 + 1):
-                address = (int.from_bytes(large_str_address, byteorder='big') + i).to_bytes(32, byteorder='big')
-                value = self.get_storage_at_address(address)
-                value = value[:bytes_length - i*32]
-                result += value
+            data_slot = slots.data_slot(var.location)
+            result = self.get_storage_range(data_slot, bytes_length // 32 + 1)[:bytes_length]
         else:
             bytes_length = (data_int & 0xFF) // 2
             result = data[:bytes_length]
@@ -547,24 +737,31 @@ class Debugger:
         return [location, offset]
 
     def eval_storage_fixed_array_at_idx(self, var, idx):
+        return self.eval_storage(self.storage_fixed_array_element(var, idx))
+
+    def storage_fixed_array_element(self, var, idx):
         element_type = var.var_type.element_type
         rel_location, offset = self.location_and_offset_for_array_idx(var.var_type, idx)
         location = var.location + rel_location
-        new_var = Variable(element_type, location = location, offset = offset, location_type = 'storage')
-        return self.eval_storage(new_var)
+        return Variable(element_type, location = location, offset = offset, location_type = 'storage')
 
     def eval_storage_array_at_idx(self, var, idx):
-        s = sha3.keccak_256()
-        s.update(var.location.to_bytes(32, 'big'))
-        elem_address = int.from_bytes(s.digest(), byteorder='big')
+        return self.eval_storage(self.storage_array_element(var, idx))
+
+    def storage_array_element(self, var, idx):
+        elem_address = slots.data_slot(var.location)
         location, offset = self.location_and_offset_for_array_idx(var.var_type, idx)
-        new_var = Variable(var.var_type.element_type, location = elem_address + location, offset = offset, location_type = 'storage')
-        return self.eval_storage(new_var)
+        return Variable(var.var_type.element_type, location = elem_address + location, offset = offset, location_type = 'storage')
 
     def eval_storage_map_at_key(self, var, key):
-        key_bytes = None
+        key_bytes = self.map_key_bytes(var.var_type.key_type, key)
+        value_type = var.var_type.value_type
+        location = slots.map_slot(key_bytes, var.location)
+        var = Variable(value_type, location = location, offset = 0, location_type = 'storage')
+        return self.eval_storage(var)
 
-        key_type = var.var_type.key_type
+    def map_key_bytes(self, key_type, key):
+        key_bytes = None
 
         if type(key_type) == String:
             key_bytes = bytes(key, 'utf-8')
@@ -588,21 +785,16 @@ class Debugger:
         else:
             raise EvalFailed()
 
-        s = sha3.keccak_256()
-        s.update(key_bytes)
-        s.update(var.location.to_bytes(32, 'big'))
-        value_address = s.digest()
-        value_type = var.var_type.value_type
-        location = int.from_bytes(value_address, 'big')
-        var = Variable(value_type, location = location, offset = 0, location_type = 'storage')
-        return self.eval_storage(var)
+        return key_bytes
 
     def eval_storage_struct_at_key(self, var, key):
         for field in var.var_type.variables:
             if field.name == key:
-                location = var.location + field.location
-                new_var = Variable(field.var_type, location = location, offset = field.offset, location_type = 'storage')
-                return self.eval_storage(new_var)
+                return self.eval_storage(self.storage_struct_field(var, field))
+
+    def storage_struct_field(self, var, field):
+        location = var.location + field.location
+        return Variable(field.var_type, location = location, offset = field.offset, location_type = 'storage')
 
     def elementary_type_as_obj(self, var_type, data):
         if type(var_type) is Int:
@@ -621,12 +813,148 @@ class Debugger:
 
         return data.hex()
 
+    def prefetch_var(self, var):
+        vars = [var]
+        planned = 0
+        while vars:
+            missing = []
+            retry = []
+            while vars:
+                v = vars.pop()
+                queries, children = self.plan_var(v)
+                queries = [q for q in queries if not self.tracer.has_snapshots([q])]
+                if queries:
+                    missing += queries
+                    retry.append(v)
+                else:
+                    planned += len(children)
+                    if planned > EXPAND_LIMIT:
+                        raise EvalResultTooLarge()
+                    vars += children
+            if not missing:
+                break
+            self.get_snapshots(missing)
+            vars = retry
+
+    def plan_var(self, var):
+        var_type = var.var_type
+        if var.location_type == 'storage':
+            if var.location >= 1 << 256:
+                return [], []
+            if type(var_type) in [Array, String, Bytes]:
+                header = self.storage_query(var.location)
+                if not self.tracer.has_snapshots([header]):
+                    return [header], []
+                value = int.from_bytes(self.get_storage_at_address(var.location.to_bytes(32, 'big')), 'big')
+                if type(var_type) is Array:
+                    self.check_expand_size(value)
+                    if type(var_type.element_type) in ELEMENTARY_TYPES:
+                        return self.storage_range_queries(*self.storage_elements_range(var, value)), []
+                    return [], self.storage_array_elements(var, value)
+                if not value & 0x1:
+                    return [], []
+                self.check_expand_size((value - 1) // 2 // 32)
+                return self.storage_range_queries(slots.data_slot(var.location), (value - 1) // 2 // 32 + 1), []
+            elif type(var_type) is FixedArray:
+                self.check_expand_size(var_type.length)
+                if type(var_type.element_type) in ELEMENTARY_TYPES:
+                    return self.storage_range_queries(*self.storage_elements_range(var, var_type.length)), []
+                return [], self.storage_array_elements(var, var_type.length)
+            elif type(var_type) is Struct:
+                return [], [self.storage_struct_field(var, field) for field in var_type.variables]
+            elif type(var_type) is Map:
+                return [], []
+            return [self.storage_query(var.location)], []
+        elif var.location_type == 'memory':
+            if type(var_type) in [Array, String, Bytes]:
+                header = self.memory_query(var.location)
+                if not self.tracer.has_snapshots([header]):
+                    return [header], []
+                length = int.from_bytes(self.get_memory(var.location), 'big')
+                self.check_expand_size(length // 32 if type(var_type) is not Array else length)
+                if type(var_type) is not Array:
+                    return self.memory_range_queries(var.location + 32, (length + 31) // 32 * 32), []
+                if type(var_type.element_type) in ELEMENTARY_TYPES:
+                    return self.memory_range_queries(var.location + 32, length * 32), []
+                elements = [(var_type.element_type, var.location + (i + 1) * 32) for i in range(length)]
+            elif type(var_type) is FixedArray:
+                self.check_expand_size(var_type.length)
+                if type(var_type.element_type) in ELEMENTARY_TYPES:
+                    return self.memory_range_queries(var.location, var_type.length * 32), []
+                elements = [(var_type.element_type, var.location + i * 32) for i in range(var_type.length)]
+            elif type(var_type) is Struct:
+                elements = [(field.var_type, var.location + i * 32) for i, field in enumerate(var_type.variables)]
+            else:
+                return [self.memory_query(var.location)], []
+            pointers = [self.memory_query(addr) for element_type, addr in elements
+                        if type(element_type) in [String, Bytes, Struct, Array, FixedArray]]
+            if not self.tracer.has_snapshots(pointers):
+                return pointers, []
+            return [], [self.memory_element(element_type, addr) for element_type, addr in elements]
+        return [], []
+
+    def check_expand_size(self, size):
+        if size > EXPAND_LIMIT:
+            raise EvalResultTooLarge()
+
+    def storage_query(self, slot):
+        return (self.position, 'storage', '%064x' % slot)
+
+    def memory_query(self, addr):
+        return (self.position, 'memory', addr)
+
+    def storage_range_queries(self, slot, count):
+        if count == 0:
+            return []
+        return [(self.position, 'storage_range', ('%064x' % slot, count))]
+
+    def memory_range_queries(self, offset, length):
+        if length == 0:
+            return []
+        return [(self.position, 'memory_range', (offset, length))]
+
+    def storage_elements_range(self, var, length):
+        slot = self.storage_elements_base(var)
+        if length == 0:
+            return slot, 0
+        return slot, self.location_and_offset_for_array_idx(var.var_type, length - 1)[0] + 1
+
+    def storage_elements_base(self, var):
+        if type(var.var_type) is Array:
+            return slots.data_slot(var.location)
+        return var.location
+
+    def storage_array_elements(self, var, count):
+        element_type = var.var_type.element_type
+        base = self.storage_elements_base(var)
+        return [Variable(element_type, location = location, offset = offset, location_type = 'storage')
+                for location, offset in slots.element_slots(base, element_type.size, count)]
+
+    def expand_elementary_elements(self, var, length):
+        element_type = var.var_type.element_type
+        res = []
+        if var.location_type == 'storage':
+            slot, count = self.storage_elements_range(var, length)
+            data = self.get_storage_range(slot, count)
+            for location, offset in slots.element_slots(0, element_type.size, length):
+                res.append(self.storage_word_as_obj(element_type, offset, data[location * 32:(location + 1) * 32]))
+        elif var.location_type == 'memory':
+            offset = var.location + 32 if type(var.var_type) is Array else var.location
+            data = self.get_memory_range(offset, length * 32)
+            for i in range(length):
+                res.append(self.elementary_type_as_obj(element_type, data[i * 32:(i + 1) * 32]))
+        return res
+
     def expand_fixed_array(self, var):
         length = var.var_type.length
+        if type(var.var_type.element_type) in ELEMENTARY_TYPES:
+            return self.expand_elementary_elements(var, length)
         res = []
+        if var.location_type == 'storage':
+            elements = self.storage_array_elements(var, length)
         for i in range(length):
             if var.location_type == 'storage':
-                el = self.eval_storage_fixed_array_at_idx(var, i)
+                el = self.eval_storage(elements[i])
             elif var.location_type == 'memory':
                 el = self.eval_memory_array_at_idx(var, i)
 
@@ -644,10 +972,14 @@ class Debugger:
             length = self.get_memory(var.location)
 
         length = (int).from_bytes(length, byteorder = 'big')
+        if type(var.var_type.element_type) in ELEMENTARY_TYPES:
+            return self.expand_elementary_elements(var, length)
 
+        if var.location_type == 'storage':
+            elements = self.storage_array_elements(var, length)
         for i in range(length):
             if var.location_type == 'storage':
-                el = self.eval_storage_array_at_idx(var, i)
+                el = self.eval_storage(elements[i])
             elif var.location_type == 'memory':
                 el = self.eval_memory_array_at_idx(var, i)
 
@@ -690,6 +1022,6 @@ class Debugger:
                     abs_path = src_path
                     break
         if abs_path:
-            bp = Breakpoint(abs_path, breakpoint.line)
+            bp = Breakpoint(abs_path, breakpoint.line, breakpoint.condition)
             self.breakpoints.append(bp)
             return bp
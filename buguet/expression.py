@@ -0,0 +1,287 @@
+from buguet.parser import *
+from buguet.models import Int, Uint, Bool, Address, Map, Array, FixedArray, Struct
+
+class EvalFailed(Exception):
+    pass
+
+def int_operands(left, right):
+    return type(left) is int
+
+def bool_operands(left, right):
+    return type(left) is bool
+
+def any_operands(left, right):
+    return True
+
+def divide(left, right):
+    if right == 0:
+        raise EvalFailed()
+    return left // right
+
+def modulo(left, right):
+    if right == 0:
+        raise EvalFailed()
+    return left % right
+
+BINARY_OPERATORS = {
+    Mult: (int_operands, lambda l, r: l * r),
+    Div: (int_operands, divide),
+    Mod: (int_operands, modulo),
+    Plus: (lambda l, r: type(l) in [int, str], lambda l, r: l + r),
+    Minus: (int_operands, lambda l, r: l - r),
+    Gt: (int_operands, lambda l, r: l > r),
+    Ge: (int_operands, lambda l, r: l >= r),
+    Lt: (int_operands, lambda l, r: l < r),
+    Le: (int_operands, lambda l, r: l <= r),
+    Eq: (any_operands, lambda l, r: l == r),
+    NotEq: (any_operands, lambda l, r: l != r),
+    And: (bool_operands, lambda l, r: l and r),
+    Or: (bool_operands, lambda l, r: l or r)
+}
+
+def compile_expression(expr):
+    if type(expr) is Literal:
+        value = expr.value
+        return lambda debugger: value
+    elif type(expr) is Name:
+        return compile_name(expr.value)
+    elif type(expr) is ApplyBrackets:
+        left = compile_expression(expr.left)
+        right = compile_expression(expr.right)
+        return lambda debugger: debugger.apply_brackets(left(debugger), right(debugger))
+    elif type(expr) is ApplyDot:
+        return compile_apply_dot(expr)
+    elif type(expr) is Not:
+        return compile_not(compile_expression(expr.value))
+    elif type(expr) in BINARY_OPERATORS:
+        return compile_binary_operator(expr)
+    else:
+        raise EvalFailed()
+
+def compile_name(name):
+    if name == "this":
+        return lambda debugger: debugger.get_snapshot('address')
+
+    bindings = {}
+
+    def evaluate(debugger):
+        function = debugger.current_func()
+        key = (id(debugger.current_contract()), id(function))
+        if key not in bindings:
+            bindings[key] = debugger.var_binding(function, name)
+        return debugger.eval_binding(function, bindings[key])
+    return evaluate
+
+def compile_apply_dot(expr):
+    key = expr.right.value
+    if expr.left == Name("msg") and key in ["sender", "value"]:
+        return lambda debugger: debugger.get_snapshot(key)
+    left = compile_expression(expr.left)
+    return lambda debugger: debugger.apply_dot(left(debugger), key)
+
+def compile_not(operand):
+    def evaluate(debugger):
+        value = operand(debugger)
+        if type(value) != bool:
+            raise EvalFailed()
+        return not value
+    return evaluate
+
+def compile_binary_operator(expr):
+    check, operator = BINARY_OPERATORS[type(expr)]
+    left = compile_expression(expr.left)
+    right = compile_expression(expr.right)
+
+    def evaluate(debugger):
+        l = left(debugger)
+        r = right(debugger)
+        if type(l) != type(r) or not check(l, r):
+            raise EvalFailed()
+        return operator(l, r)
+    return evaluate
+
+JS_INT_OPERATORS = {
+    Mult: "{0}.multiply({1})",
+    Div: "h.div({0}, {1})",
+    Mod: "h.mod({0}, {1})",
+    Plus: "{0}.add({1})",
+    Minus: "{0}.subtract({1})",
+    Gt: "{0}.greater({1})",
+    Ge: "{0}.greaterOrEquals({1})",
+    Lt: "{0}.lesser({1})",
+    Le: "{0}.lesserOrEquals({1})",
+    Eq: "{0}.equals({1})",
+    NotEq: "{0}.notEquals({1})"
+}
+
+JS_BOOL_OPERATORS = {
+    Eq: "({0} === {1})",
+    NotEq: "({0} !== {1})",
+    And: "h.and({0}, {1})",
+    Or: "h.or({0}, {1})"
+}
+
+class JsStorageRef:
+    def __init__(self, slot, offset, var_type):
+        self.slot = slot
+        self.offset = offset
+        self.var_type = var_type
+
+def reads_trace(expr):
+    if type(expr) is Literal:
+        return False
+    elif type(expr) is Not:
+        return reads_trace(expr.value)
+    elif type(expr) in BINARY_OPERATORS:
+        return reads_trace(expr.left) or reads_trace(expr.right)
+    else:
+        return True
+
+def js_value(value):
+    if type(value) is not JsStorageRef:
+        return value
+    var_type = value.var_type
+    if type(var_type) not in [Int, Uint, Bool, Address]:
+        raise EvalFailed()
+    code = "h.bits(h.storage(log, db, %s), %s, %d)" % (value.slot, value.offset, var_type.size)
+    if type(var_type) is Int:
+        return ("h.signed(%s, %d)" % (code, var_type.size), int)
+    if type(var_type) is Bool:
+        return ("%s.equals(1)" % code, bool)
+    if type(var_type) is Address:
+        return (code, Address)
+    return (code, int)
+
+def compile_js_program(expr):
+    translate = compile_js_expression(expr)
+    return lambda debugger: js_value(translate(debugger))
+
+def compile_js_expression(expr):
+    if type(expr) is Literal:
+        if type(expr.value) is bool:
+            code = ("true" if expr.value else "false", bool)
+        elif type(expr.value) is int:
+            code = ("bigInt('%d')" % expr.value, int)
+        else:
+            raise EvalFailed()
+        return lambda debugger: code
+    elif type(expr) is Name:
+        return compile_js_name(expr.value)
+    elif type(expr) is ApplyBrackets:
+        return compile_js_apply_brackets(expr)
+    elif type(expr) is ApplyDot:
+        return compile_js_apply_dot(expr)
+    elif type(expr) is Not:
+        return compile_js_not(compile_js_expression(expr.value))
+    elif type(expr) in BINARY_OPERATORS:
+        return compile_js_binary_operator(expr)
+    else:
+        raise EvalFailed()
+
+def compile_js_name(name):
+    bindings = {}
+
+    def translate(debugger):
+        function = debugger.current_func()
+        key = (id(debugger.current_contract()), id(function))
+        if key not in bindings:
+            bindings[key] = debugger.var_binding(function, name)
+        return debugger.js_binding(function, bindings[key])
+    return translate
+
+def compile_js_apply_brackets(expr):
+    left = compile_js_expression(expr.left)
+    literal = type(expr.right) is Literal
+    right = None if literal and type(expr.right.value) is str else compile_js_expression(expr.right)
+
+    def translate(debugger):
+        ref = left(debugger)
+        if type(ref) is not JsStorageRef:
+            raise EvalFailed()
+        var_type = ref.var_type
+        if type(var_type) is Map:
+            if literal:
+                try:
+                    key_bytes = debugger.map_key_bytes(var_type.key_type, expr.right.value)
+                except (AttributeError, TypeError, ValueError, OverflowError):
+                    raise EvalFailed()
+                key = "h.hexBytes('%s')" % key_bytes.hex()
+            else:
+                key = js_map_key(var_type.key_type, js_value(right(debugger)))
+            slot = "h.keccak(%s.concat(h.word(%s)))" % (key, ref.slot)
+            return JsStorageRef(slot, "0", var_type.value_type)
+        elif type(var_type) in [Array, FixedArray]:
+            if right is None:
+                raise EvalFailed()
+            idx, idx_type = js_value(right(debugger))
+            if idx_type is not int:
+                raise EvalFailed()
+            slot = ref.slot
+            if type(var_type) is Array:
+                slot = "h.keccak(h.word(%s))" % slot
+            size = var_type.element_type.size
+            if size < 256:
+                slot = "%s.add(h.div(%s, bigInt('%d')))" % (slot, idx, 256 // size)
+                offset = "h.mod(%s, bigInt('%d')).multiply(%d).toJSNumber()" % (idx, 256 // size, size)
+            else:
+                slot = "%s.add(%s.multiply(%d))" % (slot, idx, size // 256)
+                offset = "0"
+            return JsStorageRef(slot, offset, var_type.element_type)
+        else:
+            raise EvalFailed()
+    return translate
+
+def js_map_key(key_type, key):
+    code, value_type = key
+    if type(key_type) in [Int, Uint] and value_type is int:
+        return "h.word(%s)" % code
+    elif type(key_type) is Address and value_type is Address:
+        return "h.word(%s)" % code
+    elif type(key_type) is Bool and value_type is bool:
+        return "h.word(%s ? bigInt.one : bigInt.zero)" % code
+    else:
+        raise EvalFailed()
+
+def compile_js_apply_dot(expr):
+    key = expr.right.value
+    if expr.left == Name("msg"):
+        if key == "sender":
+            return lambda debugger: ("h.caller(log)", Address)
+        elif key == "value":
+            return lambda debugger: ("bigInt(log.contract.getValue().toString())", int)
+    left = compile_js_expression(expr.left)
+
+    def translate(debugger):
+        ref = left(debugger)
+        if type(ref) is not JsStorageRef or type(ref.var_type) is not Struct:
+            raise EvalFailed()
+        for field in ref.var_type.variables:
+            if field.name == key:
+                slot = "%s.add(bigInt('%d'))" % (ref.slot, field.location)
+                return JsStorageRef(slot, "%d" % field.offset, field.var_type)
+        raise EvalFailed()
+    return translate
+
+def compile_js_not(operand):
+    def translate(debugger):
+        code, value_type = js_value(operand(debugger))
+        if value_type is not bool:
+            raise EvalFailed()
+        return ("!" + code, bool)
+    return translate
+
+def compile_js_binary_operator(expr):
+    left = compile_js_expression(expr.left)
+    right = compile_js_expression(expr.right)
+
+    def translate(debugger):
+        l, l_type = js_value(left(debugger))
+        r, r_type = js_value(right(debugger))
+        if l_type is not r_type or l_type not in [int, bool]:
+            raise EvalFailed()
+        operators = JS_INT_OPERATORS if l_type is int else JS_BOOL_OPERATORS
+        if type(expr) not in operators:
+            raise EvalFailed()
+        result_type = int if type(expr) in [Mult, Div, Mod, Plus, Minus] else bool
+        return (operators[type(expr)].format(l, r), result_type)
+    return translate
@@ -0,0 +1,62 @@
+import codecs
+import json
+import re
+
+class JsonRpcError(Exception):
+    pass
+
+RESULT_ARRAY_RE = re.compile(r'"result"\s*:\s*\[')
+WHITESPACE_RE = re.compile(r'[\s,]*')
+
+class ResultArrayParser:
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.in_result = False
+        self.done = False
+        self.prefix = ''
+
+    def feed(self, data):
+        self.buf += self.text_decoder.decode(data)
+        if not self.in_result:
+            m = RESULT_ARRAY_RE.search(self.buf)
+            if not m:
+                return []
+            self.prefix = self.buf[:m.start()]
+            self.pos = m.end()
+            self.in_result = True
+        return self.parse_items()
+
+    def parse_items(self):
+        items = []
+        while not self.done:
+            self.pos = WHITESPACE_RE.match(self.buf, self.pos).end()
+            if self.pos >= len(self.buf):
+                break
+            if self.buf[self.pos] == ']':
+                self.done = True
+                break
+            try:
+                item, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                break
+            items.append(item)
+            self.pos = end
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        return items
+
+    def close(self):
+        if self.done:
+            return
+        if not self.in_result:
+            try:
+                response = json.loads(self.buf)
+            except ValueError:
+                raise JsonRpcError("Malformed JSON-RPC response")
+            if 'error' in response:
+                raise JsonRpcError(response['error'])
+            raise JsonRpcError("JSON-RPC response has no result array")
+        raise JsonRpcError("Truncated JSON-RPC response")
@@ -1,8 +1,12 @@
+from array import array
+from bisect import bisect_right
+from heapq import heappush, heappop
+
 class Contract:
     def __init__(self, name, src, functions, variables,
             bin_runtime, pc_to_op_idx_runtime, srcmap_runtime,
             bin_init, pc_to_op_idx_init, srcmap_init,
-            source_list, sources, source_offsets, version):
+            source_list, sources, version):
         self.name = name
         self.src = src
         self.functions = functions
@@ -15,8 +19,8 @@ class Contract:
         self.srcmap_init = srcmap_init
         self.source_list = source_list
         self.sources = sources
-        self.source_offsets = source_offsets
         self._variables_by_name = {}
+        self._function_tables = {}
         self.version = version
 
     @property
@@ -26,6 +30,41 @@ class Contract:
                 self._variables_by_name[var.name] = var
         return self._variables_by_name
 
+    def function_table(self, is_init):
+        if is_init not in self._function_tables:
+            srcmap = self.srcmap_init if is_init else self.srcmap_runtime
+            self._function_tables[is_init] = self.make_function_table(srcmap)
+        return self._function_tables[is_init]
+
+    def make_function_table(self, srcmap):
+        bounds = sorted({f.src.start for f in self.functions} | {f.src.start + f.src.length for f in self.functions})
+        order = sorted(range(len(self.functions)), key=lambda k: self.functions[k].src.start)
+        owners = array('i', [-1]) * len(bounds)
+        covering = []
+        j = 0
+        for k, bound in enumerate(bounds):
+            while j < len(order) and self.functions[order[j]].src.start <= bound:
+                f = self.functions[order[j]]
+                heappush(covering, (order[j], f.src.start + f.src.length))
+                j += 1
+            while covering and covering[0][1] <= bound:
+                heappop(covering)
+            if covering:
+                owners[k] = covering[0][0]
+
+        table = array('i', [-1]) * len(srcmap)
+        for i in range(len(srcmap)):
+            k = bisect_right(bounds, srcmap.starts[i]) - 1
+            if k >= 0:
+                table[i] = owners[k]
+        return table
+
+    def function_at(self, instruction_num, is_init):
+        table = self.function_table(is_init)
+        if instruction_num < 0 or instruction_num >= len(table) or table[instruction_num] == -1:
+            return None
+        return self.functions[table[instruction_num]]
+
 class SrcMap:
     def __init__(self, start, length, file_idx, jump):
         self.start = start
@@ -36,10 +75,57 @@ class SrcMap:
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
 
+class SourceMap:
+    def __init__(self):
+        self.starts = array('i')
+        self.lengths = array('i')
+        self.file_idxs = array('i')
+        self.jumps = array('B')
+
+    def append(self, start, length, file_idx, jump):
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.file_idxs.append(file_idx)
+        self.jumps.append(ord(jump))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if i < 0 or i >= len(self.starts):
+            raise KeyError(i)
+        return SrcMap(self.starts[i], self.lengths[i], self.file_idxs[i], chr(self.jumps[i]))
+
+    def get(self, i, default = None):
+        if i < 0 or i >= len(self.starts):
+            return default
+        return self[i]
+
+class PcMap:
+    def __init__(self, op_idxs):
+        self.op_idxs = op_idxs
+
+    def __getitem__(self, pc):
+        op_idx = self.get(pc)
+        if op_idx is None:
+            raise KeyError(pc)
+        return op_idx
+
+    def get(self, pc, default = None):
+        if pc < 0 or pc >= len(self.op_idxs) or self.op_idxs[pc] == -1:
+            return default
+        return self.op_idxs[pc]
+
+    def items(self):
+        for pc, op_idx in enumerate(self.op_idxs):
+            if op_idx != -1:
+                yield pc, op_idx
+
 class Breakpoint:
-    def __init__(self, src, line):
+    def __init__(self, src, line, condition = None):
         self.src = src
         self.line = line
+        self.condition = condition
 
 class Function:
     def __init__(self, name, src, params, local_vars, return_vars):
@@ -1,5 +1,10 @@
 import re
 
+STRING_LITERAL = re.compile('"(.*?)"')
+INT_LITERAL = re.compile("\d+")
+BOOL_LITERAL = re.compile("true|false")
+NAME = re.compile("\D\w*")
+
 class ParsingFailed(Exception):
     pass
 
@@ -113,17 +118,17 @@ class Parser:
         return self.parse_or()
 
     def parse_literal(self):
-        m = re.match('"(.*?)"', self.s[self.pos:])
+        m = STRING_LITERAL.match(self.s, self.pos)
         if m:
             self.pos += len(m.group(0))
             return Literal(m.group(1))
 
-        m = re.match("\d+", self.s[self.pos:])
+        m = INT_LITERAL.match(self.s, self.pos)
         if m:
             self.pos += len(m.group(0))
             return Literal(int(m.group(0)))
 
-        m = re.match("true|false", self.s[self.pos:])
+        m = BOOL_LITERAL.match(self.s, self.pos)
         if m:
             self.pos += len(m.group(0))
             if m.group(0) == "true":
@@ -132,7 +137,7 @@ class Parser:
                 return Literal(False)
 
     def parse_name(self):
-        m = re.match("\D\w*", self.s[self.pos:])
+        m = NAME.match(self.s, self.pos)
         if m:
             self.pos += len(m.group(0))
             return Name(m.group(0))
@@ -1,5 +1,7 @@
 from termcolor import colored
 from buguet.models import Breakpoint
+from buguet.parser import Parser, ParsingFailed
+from buguet.debugger import ConditionNotBoolean
 
 class Repl:
     def __init__(self, debugger):
@@ -25,26 +27,51 @@ class Repl:
                 if not self.debugger.is_ended():
                     self.print_lines()
             elif line == "continue" or line == "c":
-                self.debugger.continu()
-                if not self.debugger.is_ended():
+                try:
+                    self.debugger.continu()
+                    if not self.debugger.is_ended():
+                        self.print_lines()
+                except ConditionNotBoolean:
+                    print("Breakpoint condition is not boolean")
+            elif str.startswith(line, "goto "):
+                try:
+                    self.debugger.goto(int(line.split(" ")[1]))
+                    if not self.debugger.is_ended():
+                        self.print_lines()
+                except ValueError:
+                    print("Position is invalid. Specify step number")
+            elif line == "bstep" or line == "bs":
+                self.debugger.bstep()
+                self.print_lines()
+            elif line == "bnext" or line == "bn":
+                self.debugger.bnext()
+                self.print_lines()
+            elif line == "bstepout" or line == "bso":
+                self.debugger.bstepout()
+                self.print_lines()
+            elif line == "rcontinue" or line == "rc":
+                try:
+                    self.debugger.rcontinue()
                     self.print_lines()
+                except ConditionNotBoolean:
+                    print("Breakpoint condition is not boolean")
             elif line == "stack":
                 self.print_stack()
             elif line == "mem":
                 self.print_memory()
             elif str.startswith(line, "break "):
-                bp = self.parse_breakpoint(line.split(" ")[1])
+                bp = self.parse_breakpoint(line[len("break "):])
                 if bp:
                     bp = self.debugger.add_breakpoint(bp)
                     if bp:
-                        print(f"Breakpoint is set at {bp.src}:{bp.line}")
+                        print(f"Breakpoint is set at {self.format_breakpoint(bp)}")
                     else:
                         print(f"Breakpoint is not set. Location is not found.")
                 else:
-                    print("Breakpoint is invalid. Specify in format file:line")
+                    print("Breakpoint is invalid. Specify in format file:line or file:line if {expr}")
             elif line == "breakpoints":
                 for i, bp in enumerate(self.debugger.breakpoints):
-                    print(f"[{i}] {bp.src}:{bp.line}")
+                    print(f"[{i}] {self.format_breakpoint(bp)}")
             elif str.startswith(line, "unbreak "):
                 arr = line.split(" ")
                 if len(arr) == 2:
@@ -54,6 +81,23 @@ class Repl:
                             self.debugger.breakpoints.pop(num)
                     except ValueError:
                         pass
+            elif str.startswith(line, "watch "):
+                expr = line[len("watch "):]
+                if self.debugger.add_watch(expr):
+                    self.print_watches()
+                else:
+                    print("Can not parse expression")
+            elif line == "watches":
+                self.print_watches()
+            elif str.startswith(line, "unwatch "):
+                arr = line.split(" ")
+                if len(arr) == 2:
+                    try:
+                        num = int(arr[1])
+                        if num < len(self.debugger.watches) and num >= 0:
+                            self.debugger.watches.pop(num)
+                    except ValueError:
+                        pass
             elif line == "op":
                 self.print_op()
                 self.debugger.advance()
@@ -83,16 +127,37 @@ class Repl:
                 print(":" + str(i+1) + ' ', end='')
                 print(line)
 
+        self.print_watches()
+
+    def print_watches(self):
+        if not self.debugger.watches:
+            return
+        print()
+        for i, (expr, value) in enumerate(self.debugger.eval_watches()):
+            print(f"[{i}] {expr} = {value}")
+
     def parse_breakpoint(self, bp):
-        arr = bp.split(":")
+        condition = None
+        if " if " in bp:
+            bp, condition = bp.split(" if ", 1)
+            try:
+                Parser(condition).parse()
+            except ParsingFailed:
+                return
+        arr = bp.strip().split(":")
         if len(arr) != 2:
             return
         try:
             filename, line = arr[0], int(arr[1])
-            return Breakpoint(filename, line)
+            return Breakpoint(filename, line, condition)
         except ValueError:
             return
 
+    def format_breakpoint(self, bp):
+        if bp.condition:
+            return f"{bp.src}:{bp.line} if {bp.condition}"
+        return f"{bp.src}:{bp.line}"
+
     def print_stack(self):
         stack = self.debugger.tracer.get_all_stack(self.debugger.position)
         for i, x in enumerate(reversed(stack)):
@@ -127,11 +192,21 @@ Commands:
     next (n)                Next line in current frame
     stepout (so)            Step out of current function
     continue (c)            Continue execution
+    bstep (bs)              Step back to the previous line
+    bnext (bn)              Previous line in current frame
+    bstepout (bso)          Step back out to the caller
+    rcontinue (rc)          Continue execution backwards
     break {file}:{line}     Set breakpoint
+    break {file}:{line} if {expr}
+                            Set breakpoint which stops only when expr is true
     breakpoints             List breakpoints
     unbreak {idx}           Remove breakpoint
+    watch {expr}            Evaluate expression after every stop
+    watches                 List watch expressions with their values
+    unwatch {idx}           Remove watch expression
     stack                   Print current stack
     mem                     Print memory
     op                      Print and execute one instruction
+    goto {position}         Jump to the given step of the trace
     {expr}                  Evaluate expression
         """)
@@ -0,0 +1,26 @@
+import requests
+from web3 import HTTPProvider
+
+def is_http(web3):
+    return isinstance(web3.providers[0], HTTPProvider)
+
+def post(web3, payload, stream = False):
+    provider = web3.providers[0]
+    response = requests.post(provider.endpoint_uri, json=payload, stream=stream, **dict(provider.get_request_kwargs()))
+    response.raise_for_status()
+    return response
+
+def batch_request(web3, method, params_list):
+    if not params_list:
+        return []
+    payload = []
+    for i, params in enumerate(params_list):
+        payload.append({"jsonrpc": "2.0", "method": method, "params": params, "id": i})
+    results = [None] * len(params_list)
+    responses = post(web3, payload).json()
+    if not isinstance(responses, list):
+        raise ValueError("Node does not support batch requests")
+    for response in responses:
+        if isinstance(response, dict) and 'result' in response and response.get('id') in range(len(results)):
+            results[response['id']] = response['result']
+    return results
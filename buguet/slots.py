@@ -0,0 +1,23 @@
+import sha3
+from functools import lru_cache
+
+SLOT_CACHE_SIZE = 1 << 14
+
+@lru_cache(maxsize = SLOT_CACHE_SIZE)
+def keccak_slot(data):
+    s = sha3.keccak_256()
+    s.update(data)
+    return int.from_bytes(s.digest(), byteorder='big')
+
+def data_slot(slot):
+    return keccak_slot(slot.to_bytes(32, byteorder='big'))
+
+def map_slot(key_bytes, slot):
+    return keccak_slot(key_bytes + slot.to_bytes(32, byteorder='big'))
+
+def element_slots(base, element_size, count):
+    if element_size < 256:
+        elems_per_slot = 256 // element_size
+        return [(base + i // elems_per_slot, (i % elems_per_slot) * element_size) for i in range(count)]
+    slots_per_elem = element_size // 256
+    return [(base + i * slots_per_elem, 0) for i in range(count)]
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+class SnapshotCache:
+    def __init__(self, max_entries = 100000, max_size = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.size -= self.value_size(self.entries.pop(key))
+        self.entries[key] = value
+        self.size += self.value_size(value)
+        while len(self.entries) > self.max_entries or (self.size > self.max_size and len(self.entries) > 1):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self.value_size(evicted)
+
+    def value_size(self, value):
+        if type(value) in [bytes, str]:
+            return len(value)
+        if type(value) is list:
+            return sum(map(self.value_size, value))
+        return 32
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
@@ -0,0 +1,64 @@
+import mmap
+import os
+import threading
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_files = {}
+_lock = threading.Lock()
+
+def source_file(path):
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _files:
+            _files[path] = SourceFile(path)
+        return _files[path]
+
+class SourceFile:
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._line_offsets = None
+
+    def __reduce__(self):
+        return (source_file, (self.path,))
+
+    @property
+    def data(self):
+        if self._data is None:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self._data = b''
+                else:
+                    self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data
+
+    @property
+    def line_offsets(self):
+        if self._line_offsets is None:
+            self._line_offsets = self.scan_lines(self.data)
+        return self._line_offsets
+
+    def scan_lines(self, data):
+        offsets = array('q', [0])
+        if np is not None and len(data) > 0:
+            newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 0x0a) + 1
+            offsets.frombytes(newlines.astype(np.int64).tobytes())
+        else:
+            pos = data.find(b'\n')
+            while pos != -1:
+                offsets.append(pos + 1)
+                pos = data.find(b'\n', pos + 1)
+        offsets.append(len(data) + 1)
+        return offsets
+
+    def __len__(self):
+        return len(self.line_offsets) - 1
+
+    def __getitem__(self, i):
+        offsets = self.line_offsets
+        return bytes(self.data[offsets[i]:offsets[i + 1] - 1])
@@ -0,0 +1,128 @@
+import json
+import mmap
+import os
+import struct
+from buguet.trace_store import TraceStore, Column, SideTable
+from buguet.tracer import SnapshotError
+
+TRACE_MAGIC = b'BGT2'
+SNAPSHOTS_MAGIC = b'BGS1\n'
+
+class TraceCache:
+    def __init__(self, directory, chain_id, transaction_id):
+        tx = transaction_id.strip().lower().replace('0x', '')
+        self.directory = os.path.join(os.path.expanduser(directory), str(chain_id))
+        self.trace_path = os.path.join(self.directory, tx + '.trace')
+        self.snapshots_path = os.path.join(self.directory, tx + '.snapshots')
+
+    def load_base_logs(self):
+        if not os.path.exists(self.trace_path) or os.path.getsize(self.trace_path) < 8:
+            return None
+        with open(self.trace_path, 'rb') as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if data[:4] != TRACE_MAGIC:
+            return None
+        return self.decode_base_logs(data)
+
+    def store_base_logs(self, store):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.trace_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            self.encode_base_logs(store, f)
+        os.replace(tmp_path, self.trace_path)
+
+    def encode_base_logs(self, store, f):
+        n = len(store)
+        f.write(TRACE_MAGIC)
+        f.write(struct.pack('<I', n))
+        store.pcs.write_to(f)
+        store.stack_lengths.write_to(f)
+        store.ops.write_to(f)
+        f.write(bytes(-n % 4))
+        for table in [store.args, store.new_addresses]:
+            f.write(struct.pack('<I', len(table)))
+            table.positions.write_to(f)
+            table.values.write_to(f)
+
+    def decode_base_logs(self, data):
+        n = struct.unpack_from('<I', data, 4)[0]
+        offset = 8
+        store = TraceStore()
+        store.pcs, offset = self.read_column(data, offset, 'I', 4, n)
+        store.stack_lengths, offset = self.read_column(data, offset, 'H', 2, n)
+        store.ops, offset = self.read_column(data, offset, 'B', 1, n)
+        offset += -n % 4
+        tables = []
+        for _ in range(2):
+            count = struct.unpack_from('<I', data, offset)[0]
+            offset += 4
+            positions, offset = self.read_column(data, offset, 'I', 4, count)
+            values, offset = self.read_column(data, offset, 'B', 1, count * 32)
+            tables.append(SideTable(positions, values))
+        store.args, store.new_addresses = tables
+        store.finish()
+        return store
+
+    def read_column(self, data, offset, typecode, itemsize, count):
+        end = offset + itemsize * count
+        return Column(typecode, data[offset:end].cast(typecode)), end
+
+    def load_snapshots(self):
+        snapshots = {}
+        if not os.path.exists(self.snapshots_path):
+            return snapshots
+        records = 0
+        with open(self.snapshots_path, 'rb') as f:
+            valid = f.readline() == SNAPSHOTS_MAGIC
+            if valid:
+                for line in f:
+                    records += 1
+                    try:
+                        position, kind, key, value = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    snapshots[(position, kind, self.decode_key(key))] = self.decode_value(value)
+        if not valid or records != len(snapshots):
+            self.rewrite_snapshots(snapshots)
+        return snapshots
+
+    def store_snapshots(self, snapshots):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.snapshots_path, 'ab') as f:
+            if f.tell() == 0:
+                f.write(SNAPSHOTS_MAGIC)
+            self.write_snapshots(snapshots, f)
+
+    def rewrite_snapshots(self, snapshots):
+        tmp_path = self.snapshots_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOTS_MAGIC)
+            self.write_snapshots(snapshots, f)
+        os.replace(tmp_path, self.snapshots_path)
+
+    def write_snapshots(self, snapshots, f):
+        for (position, kind, key), value in snapshots.items():
+            f.write(json.dumps([position, kind, key, self.encode_value(value)]).encode() + b'\n')
+
+    def decode_key(self, key):
+        if type(key) is list:
+            return tuple(key)
+        return key
+
+    def encode_value(self, value):
+        if type(value) is bytes:
+            return {'bytes': value.hex()}
+        if type(value) is SnapshotError:
+            return {'error': value.message}
+        if type(value) is list:
+            return [self.encode_value(v) for v in value]
+        return value
+
+    def decode_value(self, value):
+        if type(value) is dict:
+            if 'error' in value:
+                return SnapshotError(value['error'])
+            return bytes.fromhex(value['bytes'])
+        if type(value) is list:
+            return [self.decode_value(v) for v in value]
+        return value
@@ -0,0 +1,398 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from buguet.trace_store import Column
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BUILD_CHUNK = 1 << 16
+CHECKPOINT_INTERVAL = 1 << 12
+
+JUMP_NONE = 0
+JUMP_IN = 1
+JUMP_OUT = 2
+
+JUMP_CODES = {'i': JUMP_IN, 'o': JUMP_OUT}
+
+SWITCH_OPS = {0x00, 0xf0, 0xf1, 0xf2, 0xf3, 0xf4, 0xfa, 0xfd}
+
+NP_TYPES = {'b': 'int8', 'B': 'uint8', 'h': 'int16', 'H': 'uint16', 'i': 'int32', 'I': 'uint32'}
+
+def as_np(column, start, end):
+    return np.frombuffer(column.slice(start, end), dtype=NP_TYPES[column.typecode])
+
+class PcTable:
+    def __init__(self, lines, sources, jumps, functions):
+        self.lines = lines
+        self.sources = sources
+        self.jumps = jumps
+        self.functions = functions
+        if np:
+            self.np_lines = np.frombuffer(lines, dtype=np.int32)
+            self.np_sources = np.frombuffer(sources, dtype=np.int16)
+            self.np_jumps = np.frombuffer(jumps, dtype=np.int8)
+            self.np_functions = np.frombuffer(functions, dtype=np.int16)
+
+class TraceIndex:
+    def __init__(self, debugger, bp_stack, contracts_stack):
+        self.debugger = debugger
+        self.store = debugger.trace_logs
+        self.bp_stack = list(bp_stack)
+        self.contracts_stack = list(contracts_stack)
+        self.built = 0
+        self.last_line = -1
+        self.lines = Column('i')
+        self.sources = Column('h')
+        self.jumps = Column('b')
+        self.functions = Column('h')
+        self.depths = Column('H')
+        self.events = Column('I')
+        self.line_changes = Column('I')
+        self.change_depths = Column('H')
+        self.change_jumps = Column('b')
+        self.runs = {}
+        self.last_location = None
+        self.checkpoint_positions = array('I')
+        self.checkpoints = []
+        self.source_paths = []
+        self.source_ids = {}
+        self.pc_tables = {}
+
+    def is_complete(self):
+        return self.store.finished and self.built >= len(self.store)
+
+    def ensure(self, i):
+        if i < self.built:
+            return True
+        self.store.wait_for(i)
+        available = len(self.store)
+        if i >= available:
+            self.build(available)
+            return False
+        self.build(min(available, max(i + 1, self.built + BUILD_CHUNK)))
+        return True
+
+    def ensure_all(self):
+        self.store.wait_finished()
+        self.build(len(self.store))
+
+    def line(self, i):
+        self.ensure(i)
+        return self.lines[i]
+
+    def source(self, i):
+        self.ensure(i)
+        return self.sources[i]
+
+    def source_path(self, i):
+        source_id = self.source(i)
+        if source_id == -1:
+            return None
+        return self.source_paths[source_id]
+
+    def jump(self, i):
+        self.ensure(i)
+        return self.jumps[i]
+
+    def function(self, i):
+        self.ensure(i)
+        return self.functions[i]
+
+    def depth(self, i):
+        self.ensure(i)
+        return self.depths[i]
+
+    def source_id(self, path):
+        if path not in self.source_ids:
+            self.source_ids[path] = len(self.source_paths)
+            self.source_paths.append(path)
+        return self.source_ids[path]
+
+    def pc_table(self, frame):
+        if frame is None:
+            key = None
+        else:
+            key = (id(frame.contract), frame.is_init)
+        if key not in self.pc_tables:
+            self.pc_tables[key] = self.make_pc_table(frame)
+        return self.pc_tables[key]
+
+    def make_pc_table(self, frame):
+        if frame is None:
+            return PcTable(array('i', [-1]), array('h', [-1]), array('b', [JUMP_NONE]), array('h', [-1]))
+
+        contract = frame.contract
+        if frame.is_init:
+            code, pc_to_op_idx, srcmap = contract.bin_init, contract.pc_to_op_idx_init, contract.srcmap_init
+        else:
+            code, pc_to_op_idx, srcmap = contract.bin_runtime, contract.pc_to_op_idx_runtime, contract.srcmap_runtime
+
+        size = len(code) // 2 + 1
+        lines = array('i', [-1]) * size
+        sources = array('h', [-1]) * size
+        jumps = array('b', [JUMP_NONE]) * size
+        functions = array('h', [-1]) * size
+        source_ids = [self.source_id(path) for path in contract.source_list]
+        function_table = contract.function_table(frame.is_init)
+
+        for pc, op_idx in pc_to_op_idx.items():
+            if pc >= size:
+                continue
+            if op_idx < len(function_table):
+                functions[pc] = function_table[op_idx]
+            frag = srcmap.get(op_idx)
+            if frag is None:
+                continue
+            jumps[pc] = JUMP_CODES.get(frag.jump, JUMP_NONE)
+            if frag.file_idx == -1 or frag.file_idx >= len(source_ids):
+                continue
+            offset_by_line = contract.sources[frag.file_idx].line_offsets
+            lines[pc] = max(bisect_right(offset_by_line, frag.start) - 1, 0)
+            sources[pc] = source_ids[frag.file_idx]
+
+        return PcTable(lines, sources, jumps, functions)
+
+    def build(self, upto):
+        while self.built < upto:
+            start = self.built
+            end = min(upto, start + BUILD_CHUNK, (start // CHECKPOINT_INTERVAL + 1) * CHECKPOINT_INTERVAL)
+            if start % CHECKPOINT_INTERVAL == 0:
+                self.add_checkpoint(start)
+            pcs = self.store.pcs.slice(start, end)
+            ops = self.store.ops.slice(start, end)
+            a = 0
+            for b in self.switch_offsets(ops):
+                self.build_segment(start, pcs, a, b + 1)
+                if len(self.events) == 0 or self.events[len(self.events) - 1] != start + b:
+                    self.events.append(start + b)
+                self.debugger.switch_contract(start + b, self.bp_stack, self.contracts_stack)
+                self.add_checkpoint(start + b + 1)
+                a = b + 1
+            if a < end - start:
+                self.build_segment(start, pcs, a, end - start)
+            self.built = end
+
+    def add_checkpoint(self, position):
+        if len(self.checkpoint_positions) > 0 and self.checkpoint_positions[-1] == position:
+            return
+        self.checkpoint_positions.append(position)
+        self.checkpoints.append((tuple(self.bp_stack), tuple(self.contracts_stack)))
+
+    def checkpoint_before(self, position):
+        self.ensure(position)
+        k = bisect_right(self.checkpoint_positions, position) - 1
+        bp_stack, contracts_stack = self.checkpoints[k]
+        return self.checkpoint_positions[k], bp_stack, contracts_stack
+
+    def switch_offsets(self, ops):
+        if np:
+            return np.flatnonzero(np.isin(np.frombuffer(ops, dtype=np.uint8), list(SWITCH_OPS))).tolist()
+        return [i for i, op in enumerate(ops) if op in SWITCH_OPS]
+
+    def build_segment(self, base, pcs, a, b):
+        frame = self.contracts_stack[-1] if self.contracts_stack else None
+        table = self.pc_table(frame)
+        size = len(table.lines) - 1
+
+        if np:
+            idx = np.minimum(np.frombuffer(pcs, dtype=np.uint32)[a:b], size)
+            lines = table.np_lines[idx]
+            sources = table.np_sources[idx]
+            jumps = table.np_jumps[idx]
+            functions = table.np_functions[idx]
+            jump_offsets = np.flatnonzero(jumps).tolist()
+        else:
+            idx = [pc if pc < size else size for pc in pcs[a:b]]
+            lines = array('i', [table.lines[pc] for pc in idx])
+            sources = array('h', [table.sources[pc] for pc in idx])
+            jumps = array('b', [table.jumps[pc] for pc in idx])
+            functions = array('h', [table.functions[pc] for pc in idx])
+            jump_offsets = [i for i, jump in enumerate(jumps) if jump != JUMP_NONE]
+
+        depths = array('H')
+        cur = 0
+        for e in jump_offsets:
+            depths += array('H', [len(self.bp_stack)]) * (e + 1 - cur)
+            cur = e + 1
+            position = base + a + e
+            self.events.append(position)
+            if jumps[e] == JUMP_IN:
+                self.bp_stack.append(self.store.stack_length(position) - 1)
+            elif len(self.bp_stack) > 0:
+                self.bp_stack.pop()
+        depths += array('H', [len(self.bp_stack)]) * (b - a - cur)
+
+        if np:
+            valid = np.flatnonzero(lines != -1)
+            values = lines[valid]
+            prev = np.concatenate(([self.last_line], values[:-1]))
+            changes = valid[values != prev]
+            if len(values) > 0:
+                self.last_line = int(values[-1])
+            np_depths = np.frombuffer(depths, dtype=np.uint16)
+            self.line_changes.extend_bytes((changes + base + a).astype(np.uint32).tobytes())
+            self.change_depths.extend_bytes(np_depths[changes].tobytes())
+            self.change_jumps.extend_bytes(jumps[changes].tobytes())
+            self.lines.extend_bytes(lines.tobytes())
+            self.sources.extend_bytes(sources.tobytes())
+            self.jumps.extend_bytes(jumps.tobytes())
+            self.functions.extend_bytes(functions.tobytes())
+        else:
+            for i, line in enumerate(lines):
+                if line != -1 and line != self.last_line:
+                    self.line_changes.append(base + a + i)
+                    self.change_depths.append(depths[i])
+                    self.change_jumps.append(jumps[i])
+                    self.last_line = line
+            self.lines.extend(lines)
+            self.sources.extend(sources)
+            self.jumps.extend(jumps)
+            self.functions.extend(functions)
+        self.depths.extend(depths)
+        self.add_runs(base + a, lines, sources)
+
+    def add_runs(self, base, lines, sources):
+        if len(lines) == 0:
+            return
+        if np:
+            keys = sources.astype(np.int64) << 32 | (lines.astype(np.int64) & 0xffffffff)
+            starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+            if self.last_location != (int(sources[0]), int(lines[0])):
+                starts = np.concatenate(([0], starts))
+            starts = starts[lines[starts] != -1]
+            order = np.argsort(keys[starts], kind='stable')
+            starts = starts[order]
+            start_keys = keys[starts]
+            bounds = np.flatnonzero(start_keys[1:] != start_keys[:-1]) + 1
+            for group in np.split(starts, bounds):
+                if len(group) == 0:
+                    continue
+                location = (int(sources[group[0]]), int(lines[group[0]]))
+                self.runs.setdefault(location, array('I')).frombytes((group + base).astype(np.uint32).tobytes())
+            self.last_location = (int(sources[-1]), int(lines[-1]))
+        else:
+            for i in range(len(lines)):
+                location = (sources[i], lines[i])
+                if location != self.last_location:
+                    if lines[i] != -1:
+                        self.runs.setdefault(location, array('I')).append(base + i)
+                    self.last_location = location
+
+    def events_between(self, start, end):
+        self.ensure(end - 1)
+        k = bisect_left(self.events, start)
+        result = []
+        while k < len(self.events) and self.events[k] < end:
+            result.append(self.events[k])
+            k += 1
+        return result
+
+    def first_valid_line(self, start):
+        pos = start
+        while self.ensure(pos):
+            end = self.built
+            if np:
+                found = np.flatnonzero(as_np(self.lines, pos, end) != -1)
+                if len(found) > 0:
+                    return pos + int(found[0])
+            else:
+                for i, line in enumerate(self.lines.slice(pos, end)):
+                    if line != -1:
+                        return pos + i
+            pos = end
+        return None
+
+    def next_stop(self, position, max_depth = None, depth = None):
+        if self.line(position) == -1:
+            stop = self.first_valid_line(position + 1)
+            if stop is None:
+                return None
+            if self.matches_depth(self.depths[stop], max_depth, depth):
+                return stop
+            position = stop
+
+        k = bisect_right(self.line_changes, position)
+        while True:
+            while k >= len(self.line_changes):
+                if self.is_complete():
+                    return None
+                self.ensure(self.built)
+            end = len(self.line_changes)
+            if np:
+                depths = as_np(self.change_depths, k, end)
+                if max_depth is not None:
+                    found = np.flatnonzero(depths <= max_depth)
+                elif depth is not None:
+                    found = np.flatnonzero(depths == depth)
+                else:
+                    found = [0]
+                if len(found) > 0:
+                    return self.line_changes[k + int(found[0])]
+            else:
+                for i in range(k, end):
+                    if self.matches_depth(self.change_depths[i], max_depth, depth):
+                        return self.line_changes[i]
+            k = end
+
+    def prev_stop(self, position, max_depth = None):
+        self.ensure(position)
+        k = bisect_left(self.line_changes, position)
+        while k > 0:
+            start = max(0, k - BUILD_CHUNK)
+            if np:
+                depths = as_np(self.change_depths, start, k)
+                if max_depth is not None:
+                    found = np.flatnonzero(depths <= max_depth)
+                else:
+                    found = [k - start - 1]
+                if len(found) > 0:
+                    return self.line_changes[start + int(found[-1])]
+            else:
+                for i in range(k - 1, start - 1, -1):
+                    if self.matches_depth(self.change_depths[i], max_depth, None):
+                        return self.line_changes[i]
+            k = start
+        return None
+
+    def matches_depth(self, value, max_depth, depth):
+        if max_depth is not None:
+            return value <= max_depth
+        if depth is not None:
+            return value == depth
+        return True
+
+    def next_hit(self, start, locations):
+        if not self.ensure(start):
+            return None
+        if (self.sources[start], self.lines[start]) in locations:
+            return start
+        while True:
+            hit = None
+            for location in locations:
+                positions = self.runs.get(location)
+                if positions:
+                    k = bisect_right(positions, start)
+                    if k < len(positions) and (hit is None or positions[k] < hit):
+                        hit = positions[k]
+            if hit is not None:
+                return hit
+            if self.is_complete():
+                return None
+            self.ensure(self.built)
+
+    def prev_hit(self, position, locations):
+        if self.ensure(position):
+            location = (self.sources[position], self.lines[position])
+            if location in locations:
+                positions = self.runs[location]
+                position = positions[bisect_right(positions, position) - 1]
+        hit = None
+        for location in locations:
+            positions = self.runs.get(location)
+            if positions:
+                k = bisect_left(positions, position) - 1
+                if k >= 0 and (hit is None or positions[k] > hit):
+                    hit = positions[k]
+        return hit
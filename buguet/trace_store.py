@@ -0,0 +1,236 @@
+import mmap
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from buguet.opcodes import opcode_name, opcode_number
+
+SPILL_THRESHOLD = 1 << 20
+NOTIFY_INTERVAL = 1 << 12
+
+CREATE = 0xf0
+
+class Column:
+    def __init__(self, typecode, view = None):
+        self.typecode = typecode
+        self.file = None
+        self.state = (view, len(view) if view is not None else 0, array(typecode))
+
+    @property
+    def data(self):
+        return self.state[2]
+
+    @property
+    def spilled(self):
+        return self.state[1]
+
+    def __len__(self):
+        view, spilled, data = self.state
+        return spilled + len(data)
+
+    def __getitem__(self, i):
+        view, spilled, data = self.state
+        if i < spilled:
+            return view[i]
+        return data[i - spilled]
+
+    def append(self, value):
+        self.state[2].append(value)
+
+    def extend(self, values):
+        self.state[2].extend(values)
+
+    def extend_bytes(self, data):
+        self.state[2].frombytes(data)
+
+    def slice(self, start, end):
+        view, spilled, data = self.state
+        if end <= spilled:
+            return array(self.typecode, view[start:end])
+        if start >= spilled:
+            return data[start - spilled:end - spilled]
+        return array(self.typecode, view[start:]) + data[:end - spilled]
+
+    def spill(self):
+        view, spilled, data = self.state
+        if len(data) == 0:
+            return
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+            if view is not None:
+                self.file.write(view)
+        self.file.write(data.tobytes())
+        self.file.flush()
+        mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.state = (memoryview(mapped).cast(self.typecode), spilled + len(data), array(self.typecode))
+
+    def write_to(self, f):
+        view, spilled, data = self.state
+        if view is not None:
+            f.write(view)
+        f.write(data.tobytes())
+
+class SideTable:
+    def __init__(self, positions = None, values = None):
+        self.positions = positions if positions is not None else Column('I')
+        self.values = values if values is not None else Column('B')
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __setitem__(self, i, value):
+        self.positions.append(i)
+        self.values.extend_bytes(value.to_bytes(32, 'big'))
+
+    def get(self, i):
+        k = bisect_left(self.positions, i)
+        if k < len(self.positions) and self.positions[k] == i:
+            return int.from_bytes(self.values.slice(k * 32, (k + 1) * 32), 'big')
+        return None
+
+    def spill(self):
+        self.positions.spill()
+        self.values.spill()
+
+class TraceStore:
+    def __init__(self, spill_threshold = SPILL_THRESHOLD):
+        self.pcs = Column('I')
+        self.ops = Column('B')
+        self.stack_lengths = Column('H')
+        self.args = SideTable()
+        self.new_addresses = SideTable()
+        self.spill_threshold = spill_threshold
+        self.finished = False
+        self.error = None
+        self.loaded = threading.Condition()
+
+    def __len__(self):
+        # ops is extended last, so every column covers the steps counted here
+        return len(self.ops)
+
+    def __getitem__(self, i):
+        log = {'pc': self.pc(i), 'op': self.op(i), 'stack_length': self.stack_length(i)}
+        arg = self.arg(i)
+        if arg is not None:
+            log['arg'] = arg
+        new_address = self.new_address(i)
+        if new_address is not None:
+            log['new_address'] = new_address
+        return log
+
+    def pc(self, i):
+        return self.pcs[i]
+
+    def opcode(self, i):
+        return self.ops[i]
+
+    def op(self, i):
+        return opcode_name(self.ops[i])
+
+    def stack_length(self, i):
+        return self.stack_lengths[i]
+
+    def arg(self, i):
+        return self.args.get(i)
+
+    def new_address(self, i):
+        value = self.new_addresses.get(i)
+        if value is not None and self.ops[i] == CREATE:
+            return value.to_bytes(20, 'big').hex()
+        return value
+
+    def call_targets(self):
+        targets = []
+        for k in range(len(self.new_addresses)):
+            value = int.from_bytes(self.new_addresses.values.slice(k * 32, (k + 1) * 32), 'big')
+            targets.append((value & ((1 << 160) - 1)).to_bytes(20, 'big').hex())
+        return list(dict.fromkeys(targets))
+
+    def append(self, pc, opcode, stack_length):
+        self.pcs.append(pc)
+        self.stack_lengths.append(stack_length)
+        self.ops.append(opcode)
+        if len(self.ops.data) >= self.spill_threshold:
+            self.spill()
+        if len(self) % NOTIFY_INTERVAL == 0:
+            with self.loaded:
+                self.loaded.notify_all()
+
+    def extend(self, pcs, ops, stack_lengths):
+        self.pcs.extend(pcs)
+        self.stack_lengths.extend(stack_lengths)
+        self.ops.extend(ops)
+        if len(self.ops.data) >= self.spill_threshold:
+            self.spill()
+        with self.loaded:
+            self.loaded.notify_all()
+
+    def append_chunk(self, chunk):
+        for i, value in chunk['a']:
+            self.args[i] = int(value, 16)
+        for i, value in chunk['n']:
+            self.new_addresses[i] = int(value, 16)
+        self.extend(
+                self.hex_column('I', chunk['p']),
+                self.hex_column('B', chunk['o']),
+                self.hex_column('H', chunk['l'])
+            )
+
+    def append_item(self, item):
+        if 'p' in item:
+            self.append_chunk(item)
+        else:
+            self.append_log(item)
+
+    def hex_column(self, typecode, data):
+        column = array(typecode, bytes.fromhex(data))
+        if sys.byteorder == 'little' and column.itemsize > 1:
+            column.byteswap()
+        return column
+
+    def append_log(self, log):
+        i = len(self)
+        opcode = opcode_number(log['op'])
+        if log.get('arg') is not None:
+            self.args[i] = int(log['arg'])
+        if log.get('new_address') is not None:
+            if opcode == CREATE:
+                self.new_addresses[i] = int(log['new_address'], 16)
+            else:
+                self.new_addresses[i] = int(log['new_address'])
+        self.append(log['pc'], opcode, log['stack_length'])
+
+    def spill(self):
+        for column in [self.pcs, self.ops, self.stack_lengths]:
+            column.spill()
+        self.args.spill()
+        self.new_addresses.spill()
+
+    def finish(self, error = None):
+        with self.loaded:
+            self.finished = True
+            self.error = error
+            self.loaded.notify_all()
+
+    def wait_for(self, i):
+        with self.loaded:
+            while not self.finished and i >= len(self):
+                self.loaded.wait()
+        if self.error and i >= len(self):
+            raise self.error
+
+    def wait_finished(self):
+        with self.loaded:
+            while not self.finished:
+                self.loaded.wait()
+        if self.error:
+            raise self.error
+
+    @classmethod
+    def from_logs(cls, logs):
+        store = cls()
+        for log in logs:
+            store.append_item(log)
+        store.finish()
+        return store
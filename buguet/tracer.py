@@ -1,10 +1,232 @@
+import json
+import threading
+from buguet import rpc
+from buguet.trace_store import TraceStore
+from buguet.json_stream import ResultArrayParser
+
+STREAM_CHUNK_SIZE = 1 << 16
+PACKED_CHUNK_SIZE = 1 << 12
+
+KECCAK_RC = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808a, 0x8000000080008000,
+    0x000000000000808b, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008a, 0x0000000000000088, 0x0000000080008009, 0x000000008000000a,
+    0x000000008000808b, 0x800000000000008b, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800a, 0x800000008000000a,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008
+]
+
+JS_HELPERS = """
+            stack: function(log, i) {
+                return bigInt(log.stack.peek(log.stack.length() - i - 1).toString());
+            },
+
+            storage: function(log, db, slot) {
+                var word = toHex(db.getState(log.contract.getAddress(), toWord(this.hex(slot, 32)))).replace('0x', '');
+                return bigInt(word || '0', 16);
+            },
+
+            caller: function(log) {
+                return bigInt(toHex(log.contract.getCaller()).replace('0x', '') || '0', 16);
+            },
+
+            bits: function(value, offset, size) {
+                return value.shiftRight(offset).and(bigInt.one.shiftLeft(size).subtract(1));
+            },
+
+            signed: function(value, size) {
+                if (value.geq(bigInt.one.shiftLeft(size - 1))) {
+                    return value.subtract(bigInt.one.shiftLeft(size));
+                }
+                return value;
+            },
+
+            div: function(a, b) {
+                if (b.isZero()) {
+                    throw 'division by zero';
+                }
+                var q = a.divide(b);
+                if (!a.mod(b).isZero() && a.isNegative() != b.isNegative()) {
+                    q = q.subtract(1);
+                }
+                return q;
+            },
+
+            mod: function(a, b) {
+                if (b.isZero()) {
+                    throw 'division by zero';
+                }
+                var r = a.mod(b);
+                if (!r.isZero() && r.isNegative() != b.isNegative()) {
+                    r = r.add(b);
+                }
+                return r;
+            },
+
+            and: function(a, b) {
+                return a && b;
+            },
+
+            or: function(a, b) {
+                return a || b;
+            },
+
+            hex: function(value, size) {
+                if (value.isNegative()) {
+                    throw 'negative word';
+                }
+                var hex = value.toString(16);
+                if (hex.length > size * 2) {
+                    throw 'word overflow';
+                }
+                while (hex.length < size * 2) {
+                    hex = '0' + hex;
+                }
+                return hex;
+            },
+
+            hexBytes: function(hex) {
+                var bytes = [];
+                for (var i = 0; i < hex.length; i += 2) {
+                    bytes.push(parseInt(hex.substr(i, 2), 16));
+                }
+                return bytes;
+            },
+
+            word: function(value) {
+                return this.hexBytes(this.hex(value, 32));
+            },
+
+            keccak: function(bytes) {
+                var s = [];
+                for (var i = 0; i < 50; i++) {
+                    s.push(0);
+                }
+                var msg = bytes.slice(0);
+                msg.push(0x01);
+                while (msg.length % 136 != 0) {
+                    msg.push(0);
+                }
+                msg[msg.length - 1] |= 0x80;
+                for (var off = 0; off < msg.length; off += 136) {
+                    for (var i = 0; i < 34; i++) {
+                        var j = off + i * 4;
+                        s[i] ^= msg[j] | (msg[j + 1] << 8) | (msg[j + 2] << 16) | (msg[j + 3] << 24);
+                    }
+                    this.keccakf(s);
+                }
+                var hex = '';
+                for (var i = 0; i < 8; i++) {
+                    for (var b = 0; b < 4; b++) {
+                        var v = (s[i] >>> (8 * b)) & 0xff;
+                        hex += (v < 16 ? '0' : '') + v.toString(16);
+                    }
+                }
+                return bigInt(hex, 16);
+            },
+
+            keccakRC: [""" + ", ".join("0x%x, 0x%x" % (rc & 0xffffffff, rc >> 32) for rc in KECCAK_RC) + """],
+            keccakRotc: [1, 3, 6, 10, 15, 21, 28, 36, 45, 55, 2, 14, 27, 41, 56, 8, 25, 43, 62, 18, 39, 61, 20, 44],
+            keccakPiln: [10, 7, 11, 17, 18, 3, 5, 16, 8, 21, 24, 4, 15, 23, 19, 13, 12, 2, 20, 14, 22, 9, 6, 1],
+
+            keccakf: function(s) {
+                var bc = [];
+                for (var round = 0; round < 24; round++) {
+                    for (var x = 0; x < 10; x++) {
+                        bc[x] = s[x] ^ s[x + 10] ^ s[x + 20] ^ s[x + 30] ^ s[x + 40];
+                    }
+                    for (var x = 0; x < 5; x++) {
+                        var x1 = ((x + 1) % 5) * 2;
+                        var x4 = ((x + 4) % 5) * 2;
+                        var tlo = bc[x4] ^ ((bc[x1] << 1) | (bc[x1 + 1] >>> 31));
+                        var thi = bc[x4 + 1] ^ ((bc[x1 + 1] << 1) | (bc[x1] >>> 31));
+                        for (var y = 0; y < 50; y += 10) {
+                            s[y + 2 * x] ^= tlo;
+                            s[y + 2 * x + 1] ^= thi;
+                        }
+                    }
+                    var lo = s[2];
+                    var hi = s[3];
+                    for (var i = 0; i < 24; i++) {
+                        var j = this.keccakPiln[i] * 2;
+                        var nextLo = s[j];
+                        var nextHi = s[j + 1];
+                        var r = this.keccakRotc[i];
+                        if (r >= 32) {
+                            var t = lo;
+                            lo = hi;
+                            hi = t;
+                            r -= 32;
+                        }
+                        if (r > 0) {
+                            var rlo = (lo << r) | (hi >>> (32 - r));
+                            hi = (hi << r) | (lo >>> (32 - r));
+                            lo = rlo;
+                        }
+                        s[j] = lo;
+                        s[j + 1] = hi;
+                        lo = nextLo;
+                        hi = nextHi;
+                    }
+                    for (var y = 0; y < 50; y += 10) {
+                        for (var x = 0; x < 10; x++) {
+                            bc[x] = s[y + x];
+                        }
+                        for (var x = 0; x < 10; x += 2) {
+                            var x1 = (x + 2) % 10;
+                            var x2 = (x + 4) % 10;
+                            s[y + x] = bc[x] ^ (~bc[x1] & bc[x2]);
+                            s[y + x + 1] = bc[x + 1] ^ (~bc[x1 + 1] & bc[x2 + 1]);
+                        }
+                    }
+                    s[0] ^= this.keccakRC[2 * round];
+                    s[1] ^= this.keccakRC[2 * round + 1];
+                }
+            },
+"""
+
+class SnapshotFailed(Exception):
+    pass
+
+class SnapshotError:
+    def __init__(self, message):
+        self.message = message
+
 class Tracer:
-    def __init__(self, web3, transaction_id):
+    def __init__(self, web3, transaction_id, cache = None, trace_cache = None, packed = True):
         self.web3 = web3
         self.transaction_id = transaction_id
+        self.cache = cache
+        self.trace_cache = trace_cache
+        self.packed = packed
 
     def get_base_logs(self):
-        tracer = """
+        return TraceStore.from_logs(self.do_request(self.base_tracer()))
+
+    def stream_base_logs(self, on_finish = None):
+        store = TraceStore()
+        thread = threading.Thread(target=self.load_base_logs, args=(store, on_finish), daemon=True)
+        thread.start()
+        return store
+
+    def load_base_logs(self, store, on_finish):
+        try:
+            parser = ResultArrayParser()
+            for chunk in self.stream_request(self.base_tracer()):
+                for item in parser.feed(chunk):
+                    store.append_item(item)
+            parser.close()
+        except Exception as e:
+            store.finish(e)
+            return
+        store.finish()
+        if on_finish:
+            on_finish(store)
+
+    def base_tracer(self):
+        if self.packed:
+            return self.packed_base_tracer()
+        return """
         {
             logs: [],
 
@@ -41,124 +263,183 @@ class Tracer:
             }
         }
         """
-        return self.do_request(tracer)
 
-    def get_stack(self, position, i):
-        tracer = """
+    def packed_base_tracer(self):
+        return """
         {
-            val: null,
-            pos: 0,
+            chunks: [],
+            chunk: null,
+            count: 0,
+            prev_op: -1,
+            chunk_size: """+str(PACKED_CHUNK_SIZE)+""",
 
             step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                   this.val = log.stack.peek(log.stack.length() - """+str(i)+""" - 1);
+                if (this.prev_op >= 0x60 && this.prev_op < 0x80) {
+                    this.chunk.a.push([this.count - 1, log.stack.peek(0).toString(16)]);
+                }
+                if (this.prev_op == 0xf0) {
+                    this.chunk.n.push([this.count - 1, toHex(log.contract.getAddress()).replace('0x', '')]);
+                }
+                if (this.chunk == null || this.chunk.o.length == this.chunk_size) {
+                    this.flush();
+                    this.chunk = {p: [], o: [], l: [], a: [], n: []};
                 }
-                this.pos += 1;
-            },
-
-            result: function() {
-                return this.val;
-            },
-
-            fault: function() {
-            }
-        }
-        """
-        return int(self.do_request(tracer)).to_bytes(32, "big")
 
-    def get_all_stack(self, position):
-        tracer = """
-        {
-            stack: [],
-            pos: 0,
+                var op = log.op.toNumber();
+                this.chunk.p.push(('0000000' + log.getPC().toString(16)).slice(-8));
+                this.chunk.o.push(('0' + op.toString(16)).slice(-2));
+                this.chunk.l.push(('000' + log.stack.length().toString(16)).slice(-4));
 
-            step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                    for (var i = 0; i < log.stack.length(); i++) {
-                       this.stack.push(log.stack.peek(log.stack.length() - i - 1));
-                    }
+                if (op == 0xf1 || op == 0xf2 || op == 0xf4 || op == 0xfa) {
+                    this.chunk.n.push([this.count, log.stack.peek(1).toString(16)]);
                 }
-                this.pos += 1;
-            },
-
-            result: function() {
-                return this.stack;
+                this.prev_op = op;
+                this.count += 1;
             },
 
-            fault: function() {
-            }
-        }
-        """
-        return list(map(lambda x: int(x).to_bytes(32, "big"), self.do_request(tracer)))
-
-    def get_storage(self, position, key):
-        tracer = """
-        {
-            val: null,
-            pos: 0,
-
-            step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                    this.val = toHex(db.getState(log.contract.getAddress(), toWord('"""+key+"""')));
+            flush: function() {
+                if (this.chunk != null) {
+                    this.chunks.push({
+                        p: this.chunk.p.join(''),
+                        o: this.chunk.o.join(''),
+                        l: this.chunk.l.join(''),
+                        a: this.chunk.a,
+                        n: this.chunk.n
+                    });
                 }
-                this.pos += 1;
             },
 
             result: function() {
-                return this.val;
+                this.flush();
+                return this.chunks;
             },
 
             fault: function() {
             }
         }
         """
-        return bytes.fromhex(self.do_request(tracer).replace('0x', ''))
 
-    def get_memory(self, position, i):
+    def get_snapshots(self, queries):
+        queries = list(dict.fromkeys(queries))
+        if self.cache is None:
+            return self.fetch_snapshots(queries)
+
+        result = {}
+        missing = []
+        for query in queries:
+            value = self.cache.get(self.cache_key(query))
+            if value is None:
+                missing.append(query)
+            else:
+                result[query] = value
+
+        if missing:
+            fetched = self.fetch_snapshots(missing)
+            for query, value in fetched.items():
+                self.cache.put(self.cache_key(query), value)
+            if self.trace_cache and fetched:
+                self.trace_cache.store_snapshots(fetched)
+            result.update(fetched)
+        return result
+
+    def has_snapshots(self, queries):
+        if self.cache is None:
+            return False
+        return all(self.cache_key(query) in self.cache for query in queries)
+
+    def cache_key(self, query):
+        return (self.transaction_id,) + tuple(query)
+
+    def fetch_snapshots(self, queries):
+        by_position = {}
+        programs = {}
+        for i, (position, kind, key) in enumerate(queries):
+            if kind == 'program':
+                key = programs.setdefault(key, len(programs))
+            by_position.setdefault(position, []).append([i, kind, key])
+        programs = ",\n".join("function(log, db, h) { return %s; }" % p for p in programs)
+
         tracer = """
         {
-            val: null,
+            queries: """+json.dumps(by_position)+""",
+            programs: ["""+programs+"""],
+            res: {},
+            errors: {},
             pos: 0,
 
             step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                    this.val = toHex(log.memory.slice("""+str(i)+""", """+str(i)+"""+32));
+                var queries = this.queries[this.pos];
+                if (queries) {
+                    for (var j = 0; j < queries.length; j++) {
+                        var q = queries[j];
+                        try {
+                            this.res[q[0]] = this.snapshot(log, db, q[1], q[2]);
+                        } catch (e) {
+                            this.errors[q[0]] = '' + e;
+                        }
+                    }
                 }
                 this.pos += 1;
             },
 
-            result: function() {
-                return this.val;
-            },
-
-            fault: function() {
-            }
-        }
-        """
-        res = self.do_request(tracer)
-        return bytes.fromhex(res.replace('0x', ''))
-
-    def get_all_memory(self, position):
-        tracer = """
-        {
-            mem: [],
-            pos: 0,
-
-            step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
+            snapshot: function(log, db, kind, key) {
+                if (kind == 'stack') {
+                    return log.stack.peek(log.stack.length() - key - 1);
+                }
+                if (kind == 'all_stack') {
+                    var stack = [];
+                    for (var i = 0; i < log.stack.length(); i++) {
+                        stack.push(log.stack.peek(log.stack.length() - i - 1));
+                    }
+                    return stack;
+                }
+                if (kind == 'memory') {
+                    return toHex(log.memory.slice(key, key + 32));
+                }
+                if (kind == 'all_memory') {
+                    var mem = [];
                     for (var i = 0; i < 1000000; i++) {
                         var word = toHex(log.memory.slice(i*32, (i+1)*32));
                         if (word == '0x') {
                             break;
                         }
-                        this.mem.push(word);
+                        mem.push(word);
                     }
+                    return mem;
                 }
-                this.pos += 1;
+                if (kind == 'storage') {
+                    return toHex(db.getState(log.contract.getAddress(), toWord(key)));
+                }
+                if (kind == 'storage_range') {
+                    var start = bigInt(key[0], 16);
+                    var words = '';
+                    for (var i = 0; i < key[1]; i++) {
+                        var slot = toWord(this.hex(start.add(i), 32));
+                        words += toHex(db.getState(log.contract.getAddress(), slot)).replace('0x', '');
+                    }
+                    return words;
+                }
+                if (kind == 'memory_range') {
+                    return toHex(log.memory.slice(key[0], key[0] + key[1]));
+                }
+                if (kind == 'sender') {
+                    return toHex(log.contract.getCaller()).toLowerCase().replace('0x', '');
+                }
+                if (kind == 'value') {
+                    return log.contract.getValue();
+                }
+                if (kind == 'address') {
+                    return toHex(log.contract.getAddress());
+                }
+                if (kind == 'program') {
+                    return [this.programs[key](log, db, this)];
+                }
+                return null;
             },
 
+"""+JS_HELPERS+"""
             result: function() {
-                return this.mem;
+                return {values: this.res, errors: this.errors};
             },
 
             fault: function() {
@@ -166,21 +447,39 @@ class Tracer:
         }
         """
         res = self.do_request(tracer)
-        return  res
-
-    def get_sender(self, position):
+        result = {}
+        for i, query in enumerate(queries):
+            if str(i) in res['errors']:
+                result[query] = SnapshotError(res['errors'][str(i)])
+            elif str(i) in res['values']:
+                result[query] = self.decode_snapshot(query[1], res['values'][str(i)])
+            else:
+                result[query] = SnapshotError("Position is outside of the trace")
+        return result
+
+    def get_condition_hits(self, conditions, queries):
+        programs = ",\n".join("function(log, db, h) { return %s; }" % c for c in conditions)
         tracer = """
         {
-            res: null,
+            queries: """+json.dumps(queries)+""",
+            conditions: ["""+programs+"""],
+            res: [],
             pos: 0,
 
             step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                    this.res = toHex(log.contract.getCaller()).toLowerCase().replace('0x', '');
+                var c = this.queries[this.pos];
+                if (c !== undefined) {
+                    try {
+                        if (this.conditions[c](log, db, this) === true) {
+                            this.res.push(this.pos);
+                        }
+                    } catch (e) {
+                    }
                 }
                 this.pos += 1;
             },
 
+"""+JS_HELPERS+"""
             result: function() {
                 return this.res;
             },
@@ -189,58 +488,68 @@ class Tracer:
             }
         }
         """
-        res = self.do_request(tracer)
-        return  res
+        return self.do_request(tracer)
 
-    def get_value(self, position):
-        tracer = """
-        {
-            res: null,
-            pos: 0,
+    def decode_snapshot(self, kind, value):
+        if kind == 'stack':
+            return int(value).to_bytes(32, "big")
+        elif kind == 'all_stack':
+            return list(map(lambda x: int(x).to_bytes(32, "big"), value))
+        elif kind in ['memory', 'storage', 'memory_range', 'storage_range']:
+            return bytes.fromhex(value.replace('0x', ''))
+        else:
+            return value
+
+    def get_snapshot(self, position, kind, key=None):
+        query = (position, kind, key)
+        value = self.get_snapshots([query])[query]
+        if type(value) is SnapshotError:
+            raise SnapshotFailed(value.message)
+        return value
 
-            step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                    this.res = log.contract.getValue();
-                }
-                this.pos += 1;
-            },
+    def get_stack(self, position, i):
+        return self.get_snapshot(position, 'stack', i)
 
-            result: function() {
-                return this.res;
-            },
+    def get_all_stack(self, position):
+        return self.get_snapshot(position, 'all_stack')
 
-            fault: function() {
-            }
-        }
-        """
-        res = self.do_request(tracer)
-        return  res
+    def get_storage(self, position, key):
+        return self.get_snapshot(position, 'storage', key)
 
-    def get_address(self, position):
-        tracer = """
-        {
-            res: null,
-            pos: 0,
+    def get_storage_range(self, position, start_slot, count):
+        return self.get_snapshot(position, 'storage_range', ('%064x' % start_slot, count))
 
-            step: function(log, db) {
-                if (this.pos == """+str(position)+""") {
-                    this.res = toHex(log.contract.getAddress());
-                }
-                this.pos += 1;
-            },
+    def get_memory(self, position, i):
+        return self.get_snapshot(position, 'memory', i)
 
-            result: function() {
-                return this.res;
-            },
+    def get_memory_range(self, position, offset, length):
+        return self.get_snapshot(position, 'memory_range', (offset, length))
 
-            fault: function() {
-            }
-        }
-        """
-        res = self.do_request(tracer)
-        return  res
+    def get_all_memory(self, position):
+        return self.get_snapshot(position, 'all_memory')
+
+    def get_sender(self, position):
+        return self.get_snapshot(position, 'sender')
+
+    def get_value(self, position):
+        return self.get_snapshot(position, 'value')
+
+    def get_address(self, position):
+        return self.get_snapshot(position, 'address')
 
     def do_request(self, tracer):
         return self.web3.manager.request_blocking("debug_traceTransaction", [self.transaction_id, {"tracer": tracer}])
 
+    def can_stream(self):
+        return rpc.is_http(self.web3)
+
+    def stream_request(self, tracer):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "debug_traceTransaction",
+            "params": [self.transaction_id, {"tracer": tracer}],
+            "id": 1
+        }
+        return rpc.post(self.web3, payload, stream=True).iter_content(chunk_size=STREAM_CHUNK_SIZE)
+
 
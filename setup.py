@@ -19,6 +19,9 @@ setuptools.setup(
         'pysha3 >=1.0.2, <2',
         'termcolor >=1.1.0, <2'
     ],
+    extras_require={
+        'fast': ['numpy', 'orjson']
+    },
     entry_points={
         'console_scripts': [
             'buguet = buguet.cli:main'
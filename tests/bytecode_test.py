@@ -0,0 +1,35 @@
+import unittest
+from buguet import bytecode
+
+CODE = "6080604052348015600f57600080fd5b50603580601d6000396000f3fe"
+HASH32 = "11" * 32
+SOLC = "64736f6c6343" + "00050c"
+
+class TestBytecode(unittest.TestCase):
+    def test_bzzr0(self):
+        trailer = "a165627a7a72305820" + HASH32 + "0029"
+        self.assertEqual(bytecode.cut_bin_metadata(CODE + trailer), CODE)
+
+    def test_bzzr1(self):
+        trailer = "a265627a7a72315820" + HASH32 + SOLC + "0032"
+        self.assertEqual(bytecode.cut_bin_metadata(CODE + trailer), CODE)
+
+    def test_ipfs(self):
+        trailer = "a2646970667358221220" + HASH32 + SOLC + "0033"
+        self.assertEqual(bytecode.cut_bin_metadata(CODE + trailer), CODE)
+
+    def test_no_trailer(self):
+        code = CODE + "600160020a0004"
+        self.assertEqual(bytecode.cut_bin_metadata(code), code)
+
+    def test_map_without_metadata_keys(self):
+        code = CODE + "a1616101" + "0004"
+        self.assertEqual(bytecode.cut_bin_metadata(code), code)
+
+    def test_same_hash_for_different_trailers(self):
+        bzzr1 = CODE + "a265627a7a72315820" + HASH32 + SOLC + "0032"
+        ipfs = CODE + "a2646970667358221220" + "22" * 32 + SOLC + "0033"
+        self.assertEqual(bytecode.code_hash(bzzr1), bytecode.code_hash(ipfs))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from buguet.debugger import Debugger
+from buguet.debugger import Debugger, ConditionNotBoolean
 from web3 import Web3, HTTPProvider
 from web3.middleware import geth_poa_middleware
 import json
@@ -204,3 +204,96 @@ class TestDebugger(unittest.TestCase):
         debugger.add_breakpoint(Breakpoint("Foo", 179))
         debugger.continu()
         self.assertEqual(debugger.eval("b"), 37);
+
+    def test12(self):
+        debugger = self.prepare_debugger()
+        debugger.add_breakpoint(Breakpoint("Foo", 235))
+        debugger.continu()
+        position = debugger.position
+        bp_stack = list(debugger.bp_stack)
+        debugger.goto(0)
+        self.assertEqual(debugger.position, 0)
+        debugger.goto(position)
+        self.assertEqual(debugger.bp_stack, bp_stack)
+        self.assertEqual(debugger.eval("a"), 1)
+        self.assertEqual(debugger.eval("f"), 3)
+
+    def test13(self):
+        debugger = self.prepare_debugger()
+        debugger.add_breakpoint(Breakpoint("Foo", 235))
+        debugger.continu()
+        debugger.next()
+        position = debugger.position
+        debugger.next()
+        debugger.bnext()
+        self.assertEqual(debugger.position, position)
+        self.assertEqual(debugger.eval("a"), 1)
+        debugger.continu()
+        debugger.rcontinue()
+        self.assertEqual(debugger.current_line_number() + 1, 235)
+        self.assertEqual(debugger.eval("f"), 3)
+
+    def test14(self):
+        debugger = self.prepare_debugger()
+        debugger.add_breakpoint(Breakpoint("Foo", 235))
+        debugger.continu()
+        self.assertTrue(debugger.add_watch("a"))
+        self.assertTrue(debugger.add_watch("f"))
+        self.assertFalse(debugger.add_watch("("))
+        self.assertEqual(debugger.eval_watches(), [("a", 1), ("f", 3)])
+
+    def test15(self):
+        debugger = self.prepare_debugger()
+        debugger.add_breakpoint(Breakpoint("Foo", 235, "a == 1"))
+        debugger.continu()
+        self.assertEqual(debugger.current_line_number() + 1, 235)
+        self.assertEqual(debugger.eval("f"), 3)
+        debugger.breakpoints = []
+        debugger.goto(0)
+        debugger.add_breakpoint(Breakpoint("Foo", 235, "a == 2"))
+        debugger.continu()
+        self.assertTrue(debugger.is_ended())
+
+    def test16(self):
+        debugger = self.prepare_debugger()
+        debugger.continu()
+        self.assertTrue(debugger.is_ended())
+        debugger.add_breakpoint(Breakpoint("Foo", 235))
+        debugger.rcontinue()
+        self.assertEqual(debugger.current_line_number() + 1, 235)
+        self.assertEqual(debugger.eval("f"), 3)
+        debugger.continu()
+        self.assertTrue(debugger.is_ended())
+        debugger.bstep()
+        self.assertFalse(debugger.is_ended())
+
+    def test17(self):
+        debugger = self.prepare_debugger()
+        debugger.next()
+        position = debugger.position
+        with self.assertRaises(ValueError):
+            debugger.goto(10**9)
+        with self.assertRaises(ValueError):
+            debugger.goto(-1)
+        self.assertEqual(debugger.position, position)
+        self.assertFalse(debugger.is_ended())
+
+    def test18(self):
+        debugger = self.prepare_debugger()
+        debugger.continu()
+        self.assertTrue(debugger.is_ended())
+        stepped = self.prepare_debugger()
+        while not stepped.is_ended():
+            stepped.step()
+        self.assertEqual(debugger.bp_stack, stepped.bp_stack)
+        self.assertEqual(debugger.contracts_stack, stepped.contracts_stack)
+        debugger.bstepout()
+        stepped.bstepout()
+        self.assertFalse(debugger.is_ended())
+        self.assertEqual(debugger.position, stepped.position)
+
+    def test19(self):
+        debugger = self.prepare_debugger()
+        debugger.add_breakpoint(Breakpoint("Foo", 235, "a + 1"))
+        with self.assertRaises(ConditionNotBoolean):
+            debugger.continu()
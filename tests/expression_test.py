@@ -0,0 +1,161 @@
+import unittest
+from buguet.expression import compile_expression, compile_js_program, reads_trace, JsStorageRef, EvalFailed
+from buguet.models import Int, Uint, Bool, Address, Map, Array, FixedArray, Struct, Variable
+from buguet.parser import Parser
+
+class FakeDebugger:
+    def __init__(self, values):
+        self.values = values
+        self.function = object()
+        self.contract = object()
+        self.bindings = []
+
+    def current_func(self):
+        return self.function
+
+    def current_contract(self):
+        return self.contract
+
+    def var_binding(self, function, name):
+        self.bindings.append(name)
+        return name
+
+    def eval_binding(self, function, binding):
+        if binding not in self.values:
+            raise EvalFailed()
+        return self.values[binding]
+
+    def get_snapshot(self, kind, key = None):
+        return {'sender': "ab" * 20, 'value': 5, 'address': "cd" * 20}[kind]
+
+    def apply_brackets(self, value, key):
+        return value[key]
+
+    def apply_dot(self, value, key):
+        return value[key]
+
+    def js_binding(self, function, binding):
+        if binding not in self.values:
+            raise EvalFailed()
+        return self.values[binding]
+
+    def map_key_bytes(self, key_type, key):
+        return int(key).to_bytes(32, "big")
+
+def evaluate(line, values = {}):
+    return compile_expression(Parser(line).parse())(FakeDebugger(values))
+
+def translate(line, values = {}):
+    return compile_js_program(Parser(line).parse())(FakeDebugger(values))
+
+def field(name, var_type, location, offset):
+    var = Variable(var_type, name)
+    var.location = location
+    var.offset = offset
+    return var
+
+STRUCT = Struct("S", [field("a", Uint(256), 0, 0), field("b", Bool(), 1, 0), field("c", Int(8), 1, 8)])
+
+JS_VALUES = {
+    'i': ("h.stack(log, 2)", int),
+    'flag': ("h.stack(log, 3).equals(1)", bool),
+    'total': JsStorageRef("bigInt('0')", "0", Uint(256)),
+    'neg': JsStorageRef("bigInt('1')", "8", Int(16)),
+    'owner': JsStorageRef("bigInt('1')", "24", Address()),
+    'balances': JsStorageRef("bigInt('2')", "0", Map(Uint(256), Uint(256))),
+    'flags': JsStorageRef("bigInt('3')", "0", Map(Bool(), Bool())),
+    'small': JsStorageRef("bigInt('4')", "0", Array(Uint(64))),
+    'fixed': JsStorageRef("bigInt('5')", "0", FixedArray(Uint(256), 3)),
+    'st': JsStorageRef("bigInt('8')", "0", STRUCT),
+}
+
+class TestCompileExpression(unittest.TestCase):
+    def test_operators(self):
+        self.assertEqual(evaluate("1 + 2 * 3"), 7)
+        self.assertEqual(evaluate("(7 - 2) / 2"), 2)
+        self.assertEqual(evaluate("7 % 4"), 3)
+        self.assertEqual(evaluate("2 >= 2 && 1 < 2"), True)
+        self.assertEqual(evaluate("!(1 == 2) || false"), True)
+        self.assertEqual(evaluate('"ab" + "c" == "abc"'), True)
+
+    def test_type_errors(self):
+        for line in ["1 + true", "!1", "true + true", "1 && 2", '"a" * 2', "1 / 0", "1 % 0", "1 == true"]:
+            with self.assertRaises(EvalFailed):
+                evaluate(line)
+
+    def test_names(self):
+        values = {'a': 4, 'flag': False, 'arr': [10, 20], 'st': {'x': 3}}
+        self.assertEqual(evaluate("a * 2", values), 8)
+        self.assertEqual(evaluate("!flag", values), True)
+        self.assertEqual(evaluate("arr[1] + st.x", values), 23)
+        with self.assertRaises(EvalFailed):
+            evaluate("missing", values)
+
+    def test_context(self):
+        self.assertEqual(evaluate("msg.sender"), "ab" * 20)
+        self.assertEqual(evaluate("msg.value + 1"), 6)
+        self.assertEqual(evaluate("this"), "cd" * 20)
+
+    def test_bindings_cached_per_function(self):
+        compiled = compile_expression(Parser("a + a").parse())
+        debugger = FakeDebugger({'a': 1})
+        self.assertEqual(compiled(debugger), 2)
+        self.assertEqual(compiled(debugger), 2)
+        self.assertEqual(debugger.bindings, ["a", "a"])
+        debugger.function = object()
+        compiled(debugger)
+        self.assertEqual(debugger.bindings, ["a", "a", "a", "a"])
+
+class TestCompileJsProgram(unittest.TestCase):
+    def test_literals(self):
+        self.assertEqual(translate("1 + 2"), ("bigInt('1').add(bigInt('2'))", int))
+        self.assertEqual(translate("3 > 2"), ("bigInt('3').greater(bigInt('2'))", bool))
+        self.assertEqual(translate("true && !false"), ("h.and(true, !false)", bool))
+        self.assertEqual(translate("7 / 0"), ("h.div(bigInt('7'), bigInt('0'))", int))
+
+    def test_stack_values(self):
+        self.assertEqual(translate("i % 3 == 1", JS_VALUES), ("h.mod(h.stack(log, 2), bigInt('3')).equals(bigInt('1'))", bool))
+        self.assertEqual(translate("flag || false", JS_VALUES), ("h.or(h.stack(log, 3).equals(1), false)", bool))
+
+    def test_storage_values(self):
+        self.assertEqual(translate("total", JS_VALUES), ("h.bits(h.storage(log, db, bigInt('0')), 0, 256)", int))
+        self.assertEqual(translate("neg", JS_VALUES), ("h.signed(h.bits(h.storage(log, db, bigInt('1')), 8, 16), 16)", int))
+        self.assertEqual(translate("owner", JS_VALUES), ("h.bits(h.storage(log, db, bigInt('1')), 24, 160)", Address))
+
+    def test_map(self):
+        slot = "h.keccak(h.hexBytes('%s').concat(h.word(bigInt('2'))))" % ("00" * 31 + "07")
+        self.assertEqual(translate("balances[7]", JS_VALUES), ("h.bits(h.storage(log, db, %s), 0, 256)" % slot, int))
+        slot = "h.keccak(h.word(h.stack(log, 2)).concat(h.word(bigInt('2'))))"
+        self.assertEqual(translate("balances[i]", JS_VALUES), ("h.bits(h.storage(log, db, %s), 0, 256)" % slot, int))
+        slot = "h.keccak(h.word(h.stack(log, 3).equals(1) ? bigInt.one : bigInt.zero).concat(h.word(bigInt('3'))))"
+        self.assertEqual(translate("flags[flag]", JS_VALUES), ("h.bits(h.storage(log, db, %s), 0, 8).equals(1)" % slot, bool))
+
+    def test_arrays(self):
+        slot = "h.keccak(h.word(bigInt('4'))).add(h.div(h.stack(log, 2), bigInt('4')))"
+        offset = "h.mod(h.stack(log, 2), bigInt('4')).multiply(64).toJSNumber()"
+        self.assertEqual(translate("small[i]", JS_VALUES), ("h.bits(h.storage(log, db, %s), %s, 64)" % (slot, offset), int))
+        slot = "bigInt('5').add(bigInt('2').multiply(1))"
+        self.assertEqual(translate("fixed[2]", JS_VALUES), ("h.bits(h.storage(log, db, %s), 0, 256)" % slot, int))
+
+    def test_struct(self):
+        slot = "bigInt('8').add(bigInt('1'))"
+        self.assertEqual(translate("st.c", JS_VALUES), ("h.signed(h.bits(h.storage(log, db, %s), 8, 8), 8)" % slot, int))
+        self.assertEqual(translate("st.b", JS_VALUES), ("h.bits(h.storage(log, db, %s), 0, 8).equals(1)" % slot, bool))
+
+    def test_context(self):
+        self.assertEqual(translate("msg.sender"), ("h.caller(log)", Address))
+        self.assertEqual(translate("msg.value > 0")[1], bool)
+
+    def test_untranslatable(self):
+        for line in ['"a" == "a"', "1 + true", "owner == owner", "flag + 1", "!i", "st", "st.d", "balances", "total[1]",
+                "small[flag]", "fixed[\"a\"]", "missing", "msg.sender == msg.sender", "true > false"]:
+            with self.assertRaises(EvalFailed, msg=line):
+                translate(line, JS_VALUES)
+
+    def test_reads_trace(self):
+        self.assertFalse(reads_trace(Parser("1 + 2 > 2 && !false").parse()))
+        self.assertTrue(reads_trace(Parser("1 + total").parse()))
+        self.assertTrue(reads_trace(Parser("msg.value").parse()))
+
+if __name__ == '__main__':
+    unittest.main()
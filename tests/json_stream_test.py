@@ -0,0 +1,47 @@
+import json
+import unittest
+from buguet.json_stream import ResultArrayParser, JsonRpcError
+
+ITEMS = [
+    {'pc': 0, 'op': 'PUSH1', 'stack_length': 0},
+    {'p': '00000002', 'o': '60', 'l': '0001', 'a': [], 'n': []},
+    {'s': "é中\U0001f600", 'nested': [1, [2, {'x': ']'}]]},
+]
+RESPONSE = json.dumps({'jsonrpc': '2.0', 'id': 1, 'result': ITEMS}, ensure_ascii=False).encode()
+
+def parse(data, size):
+    parser = ResultArrayParser()
+    items = []
+    for i in range(0, len(data), size):
+        items += parser.feed(data[i:i + size])
+    parser.close()
+    return items
+
+class TestResultArrayParser(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        for size in [1, 2, 3, 7, 64, len(RESPONSE)]:
+            self.assertEqual(parse(RESPONSE, size), ITEMS)
+
+    def test_items_available_before_end(self):
+        parser = ResultArrayParser()
+        end = RESPONSE.index(b'}', RESPONSE.index(b'"result"')) + 1
+        self.assertEqual(parser.feed(RESPONSE[:end]), ITEMS[:1])
+        self.assertEqual(parser.feed(RESPONSE[end:]), ITEMS[1:])
+
+    def test_empty_result(self):
+        self.assertEqual(parse(b'{"id": 1, "result" : [ ]}', 1), [])
+
+    def test_error(self):
+        with self.assertRaises(JsonRpcError):
+            parse(b'{"id": 1, "error": {"code": -32000, "message": "tracing failed"}}', 5)
+
+    def test_malformed(self):
+        with self.assertRaises(JsonRpcError):
+            parse(b'<html>', 5)
+
+    def test_truncated(self):
+        with self.assertRaises(JsonRpcError):
+            parse(RESPONSE[:-10], 4)
+
+if __name__ == '__main__':
+    unittest.main()
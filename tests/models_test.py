@@ -0,0 +1,40 @@
+import random
+import unittest
+from buguet.models import Contract, Function, SrcMap, SourceMap
+
+def make_contract(functions, starts):
+    srcmap = SourceMap()
+    for start in starts:
+        srcmap.append(start, 1, 0, '-')
+    functions = [Function("f%d" % i, SrcMap(start, length, 0, '-'), [], [], []) for i, (start, length) in enumerate(functions)]
+    return Contract("C", None, functions, [], "", None, srcmap, "", None, srcmap, [], [], [0, 5, 3])
+
+def first_covering(contract, start):
+    for f in contract.functions:
+        if start >= f.src.start and start < f.src.start + f.src.length:
+            return f
+
+class TestFunctionTable(unittest.TestCase):
+    def test_function_at(self):
+        contract = make_contract([(10, 20), (40, 10)], [0, 10, 29, 30, 45, 50])
+        names = [f.name if f else None for f in [contract.function_at(i, False) for i in range(6)]]
+        self.assertEqual(names, [None, "f0", "f0", None, "f1", None])
+        self.assertIsNone(contract.function_at(-1, False))
+        self.assertIsNone(contract.function_at(6, False))
+
+    def test_overlapping_functions(self):
+        contract = make_contract([(20, 10), (0, 100), (25, 50), (60, 0)], list(range(0, 110, 5)))
+        for i, start in enumerate(range(0, 110, 5)):
+            self.assertIs(contract.function_at(i, False), first_covering(contract, start))
+
+    def test_random_functions(self):
+        rng = random.Random(1)
+        for _ in range(50):
+            functions = [(rng.randrange(100), rng.randrange(40)) for _ in range(rng.randrange(8))]
+            starts = [rng.randrange(150) for _ in range(40)]
+            contract = make_contract(functions, starts)
+            for i, start in enumerate(starts):
+                self.assertIs(contract.function_at(i, True), first_covering(contract, start))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from buguet import slots
+
+ZERO_DATA_SLOT = 0x290decd9548b62a8d60345a988386fc84ba6bc95484008f6362f93160ef3e563
+ZERO_MAP_SLOT = 0xad3228b676f7d3cd4284a5443f17f1962b36e491b30a40b2405849e597ba5fb5
+KEY_1_SLOT_3 = 0xa15bc60c955c405d20d9149c709e2460f1c2d9a497496a7f46004d1772c3054c
+
+class TestSlots(unittest.TestCase):
+    def test_data_slot(self):
+        self.assertEqual(slots.data_slot(0), ZERO_DATA_SLOT)
+
+    def test_map_slot(self):
+        self.assertEqual(slots.map_slot(bytes(32), 0), ZERO_MAP_SLOT)
+        self.assertEqual(slots.map_slot((1).to_bytes(32, 'big'), 3), KEY_1_SLOT_3)
+
+    def test_cached(self):
+        slots.keccak_slot.cache_clear()
+        slots.data_slot(5)
+        slots.data_slot(5)
+        info = slots.keccak_slot.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_packed_elements(self):
+        self.assertEqual(slots.element_slots(10, 64, 5), [(10, 0), (10, 64), (10, 128), (10, 192), (11, 0)])
+        self.assertEqual(slots.element_slots(10, 8, 33)[31:], [(10, 248), (11, 0)])
+
+    def test_wide_elements(self):
+        self.assertEqual(slots.element_slots(10, 256, 3), [(10, 0), (11, 0), (12, 0)])
+        self.assertEqual(slots.element_slots(10, 768, 2), [(10, 0), (13, 0)])
+        self.assertEqual(slots.element_slots(10, 256, 0), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from buguet.snapshot_cache import SnapshotCache
+
+class TestSnapshotCache(unittest.TestCase):
+    def test_get(self):
+        cache = SnapshotCache()
+        cache.put(('tx', 1, 'stack', 0), b'\x01' * 32)
+        self.assertEqual(cache.get(('tx', 1, 'stack', 0)), b'\x01' * 32)
+        self.assertIsNone(cache.get(('tx', 2, 'stack', 0)))
+        self.assertIn(('tx', 1, 'stack', 0), cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evict_least_recently_used(self):
+        cache = SnapshotCache(max_entries = 2)
+        cache.put('a', b'a')
+        cache.put('b', b'b')
+        cache.get('a')
+        cache.put('c', b'c')
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_evict_by_size(self):
+        cache = SnapshotCache(max_size = 100)
+        cache.put('a', b'\x00' * 60)
+        cache.put('b', [b'\x00' * 30, b'\x00' * 30])
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.size, 60)
+        cache.put('c', b'\x00' * 200)
+        self.assertEqual(list(cache.entries), ['c'])
+        self.assertEqual(cache.size, 200)
+
+    def test_replace(self):
+        cache = SnapshotCache()
+        cache.put('a', 'x' * 10)
+        cache.put('a', 'x' * 4)
+        self.assertEqual(cache.size, 4)
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from buguet.trace_cache import TraceCache, SNAPSHOTS_MAGIC
+from buguet.trace_store import TraceStore
+from buguet.tracer import SnapshotError
+
+TRANSACTION_ID = "0xAB01"
+
+LOGS = [
+    {'pc': 0, 'op': 'PUSH1', 'stack_length': 0},
+    {'pc': 2, 'op': 'SSTORE', 'stack_length': 2, 'arg': '7'},
+    {'pc': 3, 'op': 'CALL', 'stack_length': 7, 'new_address': '170'},
+    {'pc': 0, 'op': 'STOP', 'stack_length': 0},
+    {'pc': 4, 'op': 'CREATE', 'stack_length': 3, 'new_address': '0x' + 'aa' * 20},
+    {'pc': 5, 'op': 'RETURN', 'stack_length': 2},
+]
+
+SNAPSHOTS = {
+    (1, 'stack', 0): b'\x01' * 32,
+    (1, 'all_stack', None): [b'\x00' * 32, b'\x02' * 32],
+    (2, 'storage_range', ('00' * 32, 2)): b'\x03' * 64,
+    (2, 'memory_range', (32, 4)): b'\x04' * 4,
+    (3, 'program', 'h.caller(log)'): ['ab' * 20],
+    (3, 'value', None): 5,
+    (3, 'sender', None): 'cd' * 20,
+}
+
+class TestTraceCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = TraceCache(self.directory.name, 1, TRANSACTION_ID)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_base_logs(self):
+        self.assertIsNone(self.cache.load_base_logs())
+        store = TraceStore(spill_threshold = 3)
+        for log in LOGS:
+            store.append_log(log)
+        store.finish()
+        self.cache.store_base_logs(store)
+        loaded = TraceCache(self.directory.name, 1, TRANSACTION_ID.lower()).load_base_logs()
+        self.assertTrue(loaded.finished)
+        self.assertEqual([loaded[i] for i in range(len(loaded))], [store[i] for i in range(len(store))])
+
+    def test_snapshots(self):
+        self.assertEqual(self.cache.load_snapshots(), {})
+        self.cache.store_snapshots(SNAPSHOTS)
+        self.cache.store_snapshots({(4, 'memory', 1000): SnapshotError("out of bounds")})
+        snapshots = self.cache.load_snapshots()
+        error = snapshots.pop((4, 'memory', 1000))
+        self.assertIs(type(error), SnapshotError)
+        self.assertEqual(error.message, "out of bounds")
+        self.assertEqual(snapshots, SNAPSHOTS)
+
+    def test_compact_snapshots(self):
+        self.cache.store_snapshots(SNAPSHOTS)
+        self.cache.store_snapshots({(1, 'stack', 0): b'\x01' * 32})
+        with open(self.cache.snapshots_path, 'ab') as f:
+            f.write(b'[5, "stack"')
+        self.assertEqual(self.cache.load_snapshots(), SNAPSHOTS)
+        with open(self.cache.snapshots_path, 'rb') as f:
+            self.assertEqual(f.read().count(b'\n'), len(SNAPSHOTS) + 1)
+
+    def test_unknown_snapshots_format(self):
+        os.makedirs(self.cache.directory)
+        with open(self.cache.snapshots_path, 'wb') as f:
+            f.write(b'\x80\x04}\x94.')
+        self.assertEqual(self.cache.load_snapshots(), {})
+        with open(self.cache.snapshots_path, 'rb') as f:
+            self.assertEqual(f.read(), SNAPSHOTS_MAGIC)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+from array import array
+from buguet.debugger import Debugger
+from buguet.models import Contract, ContractCall, Function, SrcMap, SourceMap, PcMap, Breakpoint
+from buguet.trace_index import TraceIndex, JUMP_IN, JUMP_OUT
+from buguet.trace_store import TraceStore
+
+SOURCE = "/src/C.sol"
+
+# (line, jump) for each single byte instruction, line None is unmapped
+INSTRUCTIONS = [(1, '-'), (2, '-'), (2, 'i'), (10, '-'), (11, '-'), (11, 'o'), (3, '-'), (None, '-'), (4, '-'), (5, '-')]
+
+# (pc, op) for each step: two internal calls of g and an external call into the same contract
+STEPS = [(0, 'PUSH1'), (1, 'PUSH1'), (2, 'JUMP'), (3, 'ADD'), (4, 'ADD'), (5, 'JUMP'), (6, 'ADD'), (7, 'ADD'), (8, 'ADD'),
+         (2, 'JUMP'), (3, 'ADD'), (5, 'JUMP'), (9, 'ADD'), (9, 'CALL'), (0, 'PUSH1'), (1, 'PUSH1'), (1, 'RETURN'), (8, 'ADD'), (9, 'STOP')]
+
+LINE_STOPS = [0, 1, 3, 4, 6, 8, 9, 10, 11, 12, 14, 15, 17, 18]
+
+class LineOffsets:
+    line_offsets = list(range(0, 200, 10))
+
+def make_contract():
+    srcmap = SourceMap()
+    for line, jump in INSTRUCTIONS:
+        if line is None:
+            srcmap.append(0, 0, -1, jump)
+        else:
+            srcmap.append(line * 10, 5, 0, jump)
+    pc_map = PcMap(array('i', range(len(INSTRUCTIONS))))
+    code = "5b" * len(INSTRUCTIONS)
+    functions = [Function("main", SrcMap(0, 100, 0, '-'), [], [], []), Function("g", SrcMap(100, 30, 0, '-'), [], [], [])]
+    return Contract("C", None, functions, [], code, pc_map, srcmap, code, pc_map, srcmap, [SOURCE], [LineOffsets()], [0, 5, 3])
+
+def make_logs():
+    logs = []
+    for pc, op in STEPS:
+        log = {'pc': pc, 'op': op, 'stack_length': 4}
+        if op == 'CALL':
+            log['new_address'] = '1'
+        logs.append(log)
+    return logs
+
+def frames(debugger):
+    return [(frame.address, frame.is_init) for frame in debugger.contracts_stack]
+
+class OfflineDebugger(Debugger):
+    def __init__(self):
+        self.contract = make_contract()
+        self.contracts = [self.contract]
+        self.trace_logs = TraceStore.from_logs(make_logs())
+        self.position = 0
+        self.bp_stack = []
+        self.contracts_stack = []
+        self.load_contract_by_address("00" * 20, False)
+        self.index = TraceIndex(self, self.bp_stack, self.contracts_stack)
+        self.breakpoints = []
+        self.condition_hit_cache = {}
+
+    def resolve_contract_call(self, address, is_init):
+        return ContractCall(address, self.contract, is_init)
+
+class TestTraceIndex(unittest.TestCase):
+    def test_locations(self):
+        index = OfflineDebugger().index
+        index.ensure_all()
+        lines = [index.line(i) for i in range(len(STEPS))]
+        self.assertEqual(lines, [1, 2, 2, 10, 11, 11, 3, -1, 4, 2, 10, 11, 5, 5, 1, 2, 2, 4, 5])
+        self.assertEqual(index.source_path(0), SOURCE)
+        self.assertIsNone(index.source_path(7))
+        self.assertEqual([index.jump(i) for i in [2, 5, 9, 11]], [JUMP_IN, JUMP_OUT, JUMP_IN, JUMP_OUT])
+        self.assertEqual([index.depth(i) for i in range(len(STEPS))], [0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(list(index.line_changes), LINE_STOPS)
+
+    def test_step(self):
+        debugger = OfflineDebugger()
+        stops = []
+        while not debugger.is_ended():
+            stops.append(debugger.position)
+            debugger.step()
+        self.assertEqual(stops, LINE_STOPS)
+        self.assertEqual(debugger.contracts_stack, [])
+
+    def test_step_bstep_round_trip(self):
+        debugger = OfflineDebugger()
+        stops = []
+        while not debugger.is_ended():
+            stops.append((debugger.position, list(debugger.bp_stack), len(debugger.contracts_stack)))
+            debugger.step()
+        for stop in reversed(stops):
+            debugger.bstep()
+            self.assertEqual((debugger.position, debugger.bp_stack, len(debugger.contracts_stack)), stop)
+        debugger.bstep()
+        self.assertEqual(debugger.position, 0)
+
+    def test_next(self):
+        debugger = OfflineDebugger()
+        debugger.goto(1)
+        debugger.next()
+        self.assertEqual(debugger.position, 6)
+        debugger.next()
+        self.assertEqual(debugger.position, 8)
+        debugger.bnext()
+        self.assertEqual(debugger.position, 6)
+        debugger.bnext()
+        self.assertEqual(debugger.position, 1)
+
+    def test_stepout(self):
+        debugger = OfflineDebugger()
+        debugger.goto(3)
+        self.assertEqual(len(debugger.bp_stack), 1)
+        debugger.stepout()
+        self.assertEqual(debugger.position, 6)
+        self.assertEqual(debugger.bp_stack, [])
+        debugger.goto(11)
+        debugger.bstepout()
+        self.assertEqual(debugger.position, 9)
+
+    def test_goto(self):
+        debugger = OfflineDebugger()
+        for position in [15, 4, 17, 10, 0, 14]:
+            debugger.goto(position)
+            stepped = OfflineDebugger()
+            while stepped.position < position:
+                stepped.advance()
+            self.assertEqual(debugger.position, position)
+            self.assertEqual(debugger.bp_stack, stepped.bp_stack)
+            self.assertEqual(frames(debugger), frames(stepped))
+        with self.assertRaises(ValueError):
+            debugger.goto(len(STEPS))
+        with self.assertRaises(ValueError):
+            debugger.goto(-1)
+        self.assertEqual(debugger.position, 14)
+
+    def test_checkpoints(self):
+        index = OfflineDebugger().index
+        position, bp_stack, contracts_stack = index.checkpoint_before(15)
+        self.assertEqual(position, 14)
+        self.assertEqual(len(contracts_stack), 2)
+        self.assertEqual(index.events_between(0, 14), [2, 5, 9, 11, 13])
+
+    def test_end(self):
+        debugger = OfflineDebugger()
+        debugger.goto(10)
+        debugger.continu()
+        self.assertTrue(debugger.is_ended())
+        self.assertEqual((debugger.bp_stack, debugger.contracts_stack), ([], []))
+        debugger.bstep()
+        self.assertEqual(debugger.position, LINE_STOPS[-1])
+        debugger.continu()
+        debugger.bstepout()
+        self.assertEqual(debugger.position, 0)
+
+    def test_prev_stop(self):
+        index = OfflineDebugger().index
+        self.assertEqual(index.prev_stop(6), 4)
+        self.assertEqual(index.prev_stop(6, max_depth = 0), 1)
+        self.assertIsNone(index.prev_stop(0))
+
+    def test_hits(self):
+        index = OfflineDebugger().index
+        location = (index.source_id(SOURCE), 10)
+        self.assertEqual(index.next_hit(0, {location}), 3)
+        self.assertEqual(index.next_hit(3, {location}), 3)
+        self.assertEqual(index.next_hit(4, {location}), 10)
+        self.assertIsNone(index.next_hit(11, {location}))
+        self.assertEqual(index.prev_hit(len(STEPS), {location}), 10)
+        self.assertEqual(index.prev_hit(10, {location}), 3)
+        self.assertIsNone(index.prev_hit(3, {location}))
+
+    def test_continue(self):
+        debugger = OfflineDebugger()
+        debugger.add_breakpoint(Breakpoint("C.sol", 11))
+        debugger.add_breakpoint(Breakpoint("C.sol", 2))
+        hits = []
+        while not debugger.is_ended():
+            debugger.continu()
+            hits.append(debugger.position)
+        self.assertEqual(hits, [3, 10, 14, len(STEPS)])
+        for position in reversed(hits[:-1]):
+            debugger.rcontinue()
+            self.assertEqual(debugger.position, position)
+
+if __name__ == '__main__':
+    unittest.main()
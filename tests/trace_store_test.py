@@ -0,0 +1,95 @@
+import threading
+import unittest
+from buguet.trace_store import TraceStore, Column
+from buguet.opcodes import opcode_number
+
+ADDRESS = "00000000000000000000000000000000000000aa"
+
+LOGS = [
+    {'pc': 0, 'op': 'PUSH1', 'stack_length': 0},
+    {'pc': 2, 'op': 'PUSH1', 'stack_length': 1},
+    {'pc': 4, 'op': 'SSTORE', 'stack_length': 2, 'arg': '7'},
+    {'pc': 5, 'op': 'CALL', 'stack_length': 7, 'new_address': str(int(ADDRESS, 16))},
+    {'pc': 0, 'op': 'STOP', 'stack_length': 0},
+    {'pc': 6, 'op': 'CREATE', 'stack_length': 3, 'new_address': "0x" + ADDRESS},
+    {'pc': 7, 'op': 'RETURN', 'stack_length': 2},
+]
+
+class TestTraceStore(unittest.TestCase):
+    def check_logs(self, store):
+        self.assertEqual(len(store), len(LOGS))
+        for i, log in enumerate(LOGS):
+            self.assertEqual(store.pc(i), log['pc'])
+            self.assertEqual(store.op(i), log['op'])
+            self.assertEqual(store.stack_length(i), log['stack_length'])
+        self.assertEqual(store.arg(2), 7)
+        self.assertIsNone(store.arg(3))
+        self.assertEqual(store.new_address(3), int(ADDRESS, 16))
+        self.assertEqual(store.new_address(5), ADDRESS)
+        self.assertIsNone(store.new_address(4))
+
+    def test_from_logs(self):
+        store = TraceStore.from_logs(LOGS)
+        self.check_logs(store)
+        self.assertEqual(store[2], {'pc': 4, 'op': 'SSTORE', 'stack_length': 2, 'arg': 7})
+        self.assertEqual(store.call_targets(), [ADDRESS])
+
+    def test_packed_chunks(self):
+        store = TraceStore()
+        for start in range(0, len(LOGS), 4):
+            logs = LOGS[start:start + 4]
+            store.append_item({
+                'p': ''.join('%08x' % log['pc'] for log in logs),
+                'o': ''.join('%02x' % opcode_number(log['op']) for log in logs),
+                'l': ''.join('%04x' % log['stack_length'] for log in logs),
+                'a': [[start + i, '%x' % int(log['arg'])] for i, log in enumerate(logs) if 'arg' in log],
+                'n': [[start + i, '%x' % int(log['new_address'], 0)] for i, log in enumerate(logs) if 'new_address' in log]
+            })
+        store.finish()
+        self.check_logs(store)
+
+    def test_spill(self):
+        store = TraceStore(spill_threshold = 2)
+        for log in LOGS:
+            store.append_log(log)
+        store.finish()
+        self.assertGreater(store.pcs.spilled, 0)
+        self.assertGreater(len(store.pcs.data), 0)
+        self.check_logs(store)
+        self.assertEqual(list(store.pcs.slice(1, 6)), [log['pc'] for log in LOGS[1:6]])
+
+    def test_column_slice(self):
+        column = Column('H')
+        column.extend([1, 2, 3])
+        column.spill()
+        column.extend([4, 5])
+        self.assertEqual(list(column.slice(0, 2)), [1, 2])
+        self.assertEqual(list(column.slice(2, 5)), [3, 4, 5])
+        self.assertEqual(list(column.slice(3, 5)), [4, 5])
+        self.assertEqual(column[4], 5)
+
+    def test_wait_for(self):
+        store = TraceStore()
+        def load():
+            for log in LOGS:
+                store.append_log(log)
+            store.finish()
+        thread = threading.Thread(target=load)
+        thread.start()
+        store.wait_for(len(LOGS) - 1)
+        self.assertGreaterEqual(len(store), len(LOGS))
+        store.wait_for(len(LOGS))
+        thread.join()
+
+    def test_wait_for_error(self):
+        store = TraceStore()
+        store.append_log(LOGS[0])
+        store.finish(ValueError("trace failed"))
+        store.wait_for(0)
+        with self.assertRaises(ValueError):
+            store.wait_for(1)
+        with self.assertRaises(ValueError):
+            store.wait_finished()
+
+if __name__ == '__main__':
+    unittest.main()